@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Function call benchmark: times a recursive loop while the number of global
+definitions grows. The cost of a call should not depend on it.
+"""
+
+import time
+
+from llisp.lbuiltins import Atom
+from llisp.main import load_std
+from llisp.parser import create_program
+
+LOOP = "(def (count n) (if (eq n 0) 0 (count (- n 1))))"
+CALLS = 2_000
+
+
+def bench(globals_count: int) -> None:
+    state: dict = {}
+    load_std(state)
+    for i in range(globals_count):
+        state[f"g{i}"] = Atom.from_value(i)
+    create_program(LOOP).run(state)
+    prog = create_program(f"(count {CALLS})")
+
+    start = time.perf_counter()
+    prog.run(state)
+    elapsed = time.perf_counter() - start
+    print(f"{len(state):>8} globals {elapsed * 1e6 / CALLS:8.2f} us/call")
+
+
+def main() -> None:
+    for globals_count in (0, 1_000, 10_000, 100_000):
+        bench(globals_count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Memory benchmark: bytes per node for the syntax tree classes, and peak RSS
+of a process parsing and running a large list-heavy script.
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from typing import Callable, List
+
+from llisp.lbuiltins import Atom, LList, create_atom
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None  # type: ignore
+
+NODES = 100_000
+
+SCRIPT_FORMS = 20_000
+FORM = "(var l{i} (push {i}.5 (list {i} \"string\" (list 1.5 'c'))))\n"
+RUN = """
+(def (build n l) (if (eq n 0) l (build (- n 1) (push (+ n 0.5) l))))
+(var big (build 200000 (list)))
+"""
+
+
+def per_node(name: str, create: Callable[[int], object]) -> None:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes: List[object] = [create(i) for i in range(NODES)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    # The list holding the nodes is not part of them
+    size -= sys.getsizeof(nodes)
+    print(f"{name:>12} {size / NODES:8.1f} bytes/node")
+
+
+def peak_rss() -> None:
+    if resource is None:
+        print(f"{'peak RSS':>12} unavailable on {sys.platform}")
+        return
+    with tempfile.NamedTemporaryFile("w", suffix=".lisp", delete=False) as script:
+        for i in range(SCRIPT_FORMS):
+            script.write(FORM.format(i=i))
+        script.write(RUN)
+    # The program is parsed once and its tree kept alive while it runs
+    code = (
+        "from llisp.parser import create_program; "
+        f"create_program(open({script.name!r}).read()).run({{}})"
+    )
+    try:
+        subprocess.run([sys.executable, "-c", code], check=True)
+    finally:
+        os.unlink(script.name)
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        rss //= 1024
+    print(f"{'peak RSS':>12} {rss / 1024:8.1f} MB")
+
+
+def main() -> None:
+    per_node("num", lambda i: Atom.from_value(i + 0.5))
+    per_node("char", lambda i: create_atom("'a'"))
+    per_node("name", lambda i: create_atom("name"))
+    per_node("llist", lambda i: LList())
+    peak_rss()
+
+
+if __name__ == "__main__":
+    main()
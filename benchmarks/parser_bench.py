@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Reader scaling benchmark: parses generated sources of growing size and
+reports the throughput, which should stay flat if parsing is linear.
+"""
+
+import time
+
+from llisp.parser import create_program
+
+FORM = "(def (f{i} x y) (if (eq x 0) (+ y 1) (f{i} (- x 1) (list 'a' \"ab\" 1.5))))\n"
+
+
+def generate(size: int) -> str:
+    forms = []
+    total = 0
+    i = 0
+    while total < size:
+        form = FORM.format(i=i)
+        forms.append(form)
+        total += len(form)
+        i += 1
+    return "".join(forms)
+
+
+def nested(depth: int) -> str:
+    return "(+ 1 " * depth + "1" + ")" * depth
+
+
+def bench(name: str, source: str) -> None:
+    start = time.perf_counter()
+    create_program(source)
+    elapsed = time.perf_counter() - start
+    mb = len(source) / 1_000_000
+    print(f"{name:>12} {mb:8.2f} MB {elapsed:8.3f} s {mb / elapsed:8.2f} MB/s")
+
+
+def main() -> None:
+    for size in (1, 2, 4, 8):
+        bench("flat", generate(size * 1_000_000))
+    for depth in (100_000, 200_000, 400_000):
+        bench(f"nested {depth}", nested(depth))
+
+
+if __name__ == "__main__":
+    main()
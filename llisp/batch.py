@@ -0,0 +1,139 @@
+"""
+Runner of many scripts over pre-forked workers
+
+The std is loaded once, then the workers are forked from the loaded state
+and share its memory until they write to it. Every script runs in a fresh
+state holding the std, with its output captured, so the scripts do not see
+each other.
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+from multiprocessing.context import BaseContext
+from typing import Dict, List, NamedTuple, Optional
+
+from llisp import parallel
+from llisp.lbuiltins import Name
+from llisp.main import ENGINES, execute_file, load_std
+from llisp.optimizer import Optimizer
+
+# State holding the std, that the forked workers inherit
+_std: Dict = {}
+_engine = "tree"
+
+
+class Result(NamedTuple):
+    filename: str
+    status: int
+    out: str
+    err: str
+    elapsed: float
+
+
+def fresh_state(std: Dict) -> Dict:
+    """New state with the std, its procedures seeing the globals of the state"""
+    state: Dict = {}
+    for name, value in std.items():
+        if isinstance(value, Name) and value.env is std:
+            value = Name(value.name, value.value, value.params, state)
+        state[name] = value
+    return state
+
+
+def init_worker(engine: str, warm: bool) -> None:
+    global _engine
+    _engine = engine
+    if not warm:
+        load_std(_std)
+    # The workers of a pool cannot start a pool of their own
+    parallel.configure(workers=1, engine=engine)
+
+
+def run_script(filename: str) -> Result:
+    out, err = io.StringIO(), io.StringIO()
+    start = time.perf_counter()
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            status = execute_file(
+                filename, fresh_state(_std), engine=_engine, optimizer=Optimizer()
+            )
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    return Result(
+        filename, status, out.getvalue(), err.getvalue(), time.perf_counter() - start
+    )
+
+
+def run_many(filenames: List[str], workers: int, engine: str = "tree") -> List[Result]:
+    """Run the scripts over the workers, the results are in order"""
+    context: BaseContext
+    if "fork" in multiprocessing.get_all_start_methods():
+        load_std(_std)
+        context = multiprocessing.get_context("fork")
+        warm = True
+    else:
+        context = multiprocessing.get_context()
+        warm = False
+
+    chunksize = max(1, len(filenames) // (workers * 4))
+    with context.Pool(workers, init_worker, (engine, warm)) as pool:
+        return pool.map(run_script, filenames, chunksize)
+
+
+def summary(results: List[Result], elapsed: float) -> List[str]:
+    failed = [r for r in results if r.status != 0]
+    total = sum(r.elapsed for r in results)
+    lines = [
+        f"{len(results)} scripts, {len(failed)} failed in {elapsed:.3f}s "
+        f"({len(results) / elapsed:.1f} scripts/s)",
+        f"time in scripts: {total:.3f}s, "
+        f"mean {total / max(len(results), 1) * 1000:.2f}ms",
+    ]
+    if results:
+        slowest = max(results, key=lambda r: r.elapsed)
+        lines.append(f"slowest: {slowest.filename} {slowest.elapsed:.3f}s")
+    lines.extend(f"FAILED ({r.status}): {r.filename}" for r in failed)
+    return lines
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("files", nargs="+")
+    parser.add_argument(
+        "--engine", choices=ENGINES, default="tree", help="evaluation engine"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="processes running the scripts",
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="llisplang run-many")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return run(args)
+
+
+def run(args: argparse.Namespace) -> int:
+    start = time.perf_counter()
+    results = run_many(args.files, args.workers, args.engine)
+    elapsed = time.perf_counter() - start
+
+    for result in results:
+        sys.stdout.write(f"==> {result.filename} <==\n{result.out}")
+        if result.out and not result.out.endswith("\n"):
+            sys.stdout.write("\n")
+        sys.stderr.write(result.err)
+    print("\n".join(summary(results, elapsed)), file=sys.stderr)
+    return 1 if any(r.status != 0 for r in results) else 0
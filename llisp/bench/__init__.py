@@ -0,0 +1,138 @@
+"""
+Interpreter benchmarks
+
+Micro benchmarks time the reader and small programs on an evaluation engine,
+macro benchmarks run the project_euler scripts. Results are reported in
+operations per second and can be saved as JSON to compare two runs.
+"""
+
+import json
+import platform
+import statistics
+import time
+from typing import Any, Callable, Dict, List, NamedTuple
+
+# A drop in ops/sec larger than this fraction of the baseline is a regression
+REGRESSION_THRESHOLD = 0.1
+
+Results = Dict[str, Dict[str, Any]]
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # Prepares the benchmark for an engine and returns one iteration of it
+    setup: Callable[[str], Callable[[], Any]]
+    # Operations done by one iteration
+    ops: int
+
+
+def measure(
+    bench: Benchmark, engine: str, repeat: int = 5, min_time: float = 0.1
+) -> Dict[str, Any]:
+    """
+    Time repeat samples of the benchmark, each running enough iterations to
+    last at least min_time
+    """
+    run = bench.setup(engine)
+    run()
+
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        loops *= 2
+
+    samples = [elapsed]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            run()
+        samples.append(time.perf_counter() - start)
+
+    rates = [bench.ops * loops / sample for sample in samples]
+    mean = statistics.mean(rates)
+    stdev = statistics.stdev(rates) if len(rates) > 1 else 0.0
+    return {"ops": mean, "stdev": stdev, "rsd": stdev / mean, "samples": rates}
+
+
+def run(
+    benchmarks: List[Benchmark],
+    engine: str,
+    repeat: int = 5,
+    min_time: float = 0.1,
+    out: Callable[[str], None] = print,
+) -> Dict[str, Any]:
+    """Measure each benchmark, printing its result as soon as it is known"""
+    results: Results = {}
+    for bench in benchmarks:
+        result = measure(bench, engine, repeat, min_time)
+        results[bench.name] = result
+        out(f"{bench.name:<24} {result['ops']:>14,.1f} ops/s ±{result['rsd']:6.1%}")
+    return {
+        "engine": engine,
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any],
+    report: Dict[str, Any],
+    out: Callable[[str], None] = print,
+) -> List[str]:
+    """
+    Compare a report to a baseline, returning the names of the benchmarks
+    that regressed. A drop only counts when it is larger than both the
+    threshold and the variance of the two runs.
+    """
+    if baseline["engine"] != report["engine"]:
+        out(f"Comparing engine {report['engine']} to {baseline['engine']}")
+    regressions = []
+    for name, result in report["results"].items():
+        old = baseline["results"].get(name)
+        if old is None:
+            continue
+        change = result["ops"] / old["ops"] - 1
+        tolerance = max(REGRESSION_THRESHOLD, old["rsd"] + result["rsd"])
+        regressed = change < -tolerance
+        if regressed:
+            regressions.append(name)
+        out(
+            f"{name:<24} {old['ops']:>14,.1f} -> {result['ops']:>14,.1f} ops/s "
+            f"{change:+7.1%}{'  REGRESSION' if regressed else ''}"
+        )
+    return regressions
+
+
+def all_benchmarks() -> List[Benchmark]:
+    from llisp.bench import macro, micro
+
+    return micro.benchmarks() + macro.benchmarks()
+
+
+def main(
+    engine: str,
+    repeat: int = 5,
+    pattern: str = "",
+    output: str = "",
+    baseline: str = "",
+) -> int:
+    """
+    Run the benchmarks whose name contains pattern, optionally saving the
+    report and comparing it to a previous one. Returns 1 on regressions.
+    """
+    benchmarks = [b for b in all_benchmarks() if pattern in b.name]
+    report = run(benchmarks, engine, repeat)
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    if baseline:
+        with open(baseline) as baseline_file:
+            print(f"\nCompared to {baseline}:")
+            if compare(json.load(baseline_file), report):
+                return 1
+    return 0
@@ -0,0 +1,37 @@
+"""Macro benchmarks running the project_euler scripts from a fresh state"""
+
+import io
+import os
+from contextlib import redirect_stdout
+from typing import Any, Callable, Dict, List
+
+from llisp.bench import Benchmark
+from llisp.main import execute_file, load_std
+
+EULER_DIR = os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir, "project_euler"
+)
+
+
+def script(path: str) -> Callable[[str], Callable[[], Any]]:
+    def prepare(engine: str) -> Callable[[], Any]:
+        def iteration() -> None:
+            state: Dict = {}
+            load_std(state)
+            with redirect_stdout(io.StringIO()):
+                execute_file(path, state, engine=engine)
+
+        return iteration
+
+    return prepare
+
+
+def benchmarks() -> List[Benchmark]:
+    """One benchmark per script, none when the scripts are not available"""
+    if not os.path.isdir(EULER_DIR):
+        return []
+    return [
+        Benchmark(f"euler/{name[:-5]}", script(os.path.join(EULER_DIR, name)), 1)
+        for name in sorted(os.listdir(EULER_DIR))
+        if name.endswith(".lisp")
+    ]
@@ -0,0 +1,66 @@
+"""Micro benchmarks of the reader and of the core operations"""
+
+from typing import Any, Callable, Dict, List
+
+from llisp.bench import Benchmark
+from llisp.main import ENGINES, load_std
+from llisp.parser import create_program, read, tokenize
+
+FORM = "(def (f{i} x y) (if (eq x 0) (+ y 1) (f{i} (- x 1) (list 'a' \"ab\" 1.5))))\n"
+READER_FORMS = 200
+
+ARITHMETIC = "(+ (* 3 (- 10 4)) (// (% 17 5) 2))\n"
+ARITHMETIC_FORMS = 100
+
+CALLS = """
+(def (count n) (if (eq n 0) 0 (count (- n 1))))
+"""
+
+LISTS = """
+(def (build n l) (if (eq n 0) l (build (- n 1) (push n l))))
+(def (sum l acc) (if (eq (len l) 0) acc (sum (pop l) (+ acc (el l)))))
+"""
+
+PREDICATES = """
+(def (check n acc)
+     (if (eq n 0)
+         acc
+         (check (- n 1)
+                (+ acc (and (bool n) (! (>= n 1000)) (or (<= n 5) (> n 2)))
+                       (max (abs (- 0 n)) (min n 3))))))
+"""
+
+
+def lisp(setup: str, source: str) -> Callable[[str], Callable[[], Any]]:
+    """Benchmark of source, run on a std state where setup was run"""
+
+    def prepare(engine: str) -> Callable[[], Any]:
+        evaluate = ENGINES[engine]
+        state: Dict = {}
+        load_std(state)
+        for form in create_program(setup).childs:
+            evaluate(form, state)
+        forms = create_program(source).childs
+
+        def iteration() -> None:
+            for form in forms:
+                evaluate(form, state)
+
+        return iteration
+
+    return prepare
+
+
+def reader(engine: str) -> Callable[[], Any]:
+    source = "".join(FORM.format(i=i) for i in range(READER_FORMS))
+    return lambda: list(read(tokenize([source])))
+
+
+def benchmarks() -> List[Benchmark]:
+    return [
+        Benchmark("reader", reader, READER_FORMS),
+        Benchmark("arithmetic", lisp("", ARITHMETIC * ARITHMETIC_FORMS), 100),
+        Benchmark("calls", lisp(CALLS, "(count 1000)"), 1000),
+        Benchmark("lists", lisp(LISTS, "(sum (build 200 (list)) 0)"), 400),
+        Benchmark("std-predicates", lisp(PREDICATES, "(check 500 0)"), 500),
+    ]
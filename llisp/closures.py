@@ -0,0 +1,347 @@
+"""
+Closure compilation engine
+
+Each LList/Atom tree is compiled once into nested Python closures taking the
+state. Builtins are dispatched and constant atoms resolved at compile time,
+and the body of a procedure is compiled on its first call and kept on its
+definition.
+
+Closures compiled in tail position of a procedure body return calls to
+procedures as TailCall, which the calling closure runs in a loop.
+"""
+
+from typing import Any, Callable, Dict, List, Union
+
+from llisp.lbuiltins import (
+    BUILTINS,
+    FALSE,
+    NATIVES,
+    SPECIAL_FORMS,
+    TRUE,
+    UNBOUND,
+    VALUE_TYPES,
+    Atom,
+    Frame,
+    LList,
+    Local,
+    Name,
+    NotCallable,
+    ParseError,
+    TailCall,
+    UndefinedError,
+    assign,
+    bind,
+    is_true,
+    loop_range,
+    loop_spec,
+)
+
+# A closure returns an Atom, or a TailCall when compiled in tail position
+Closure = Callable[[Dict], Any]
+NAME = Atom.AtomTypes.NAME
+
+
+class Compiled(object):
+    """Compiled child of an expression given to a builtin"""
+
+    __slots__ = ("evaluate",)
+
+    def __init__(self, closure: Closure):
+        self.evaluate = closure
+
+
+def compile_node(node: Union[Atom, LList], tail: bool = False) -> Closure:
+    if isinstance(node, LList):
+        return compile_list(node, tail)
+    if node.type in VALUE_TYPES:
+        return lambda state: node
+    if isinstance(node, Local) and node.depth == 0:
+        return compile_local(node)
+    if node.type == NAME and type(node) is Name:
+        return compile_name(node.value_str)
+    return node.evaluate
+
+
+def compile_local(node: Local) -> Closure:
+    index = node.index
+
+    def load(frame: Any) -> Atom:
+        value = frame.slots[index]
+        if value is UNBOUND:
+            return node.evaluate(frame)
+        if value.type in VALUE_TYPES:
+            return value
+        return value.evaluate(frame)
+
+    return load
+
+
+def compile_name(name: str) -> Closure:
+    def load(state: Dict) -> Atom:
+        try:
+            value = state[name]
+        except KeyError:
+            raise UndefinedError(f"{name} Undefined")
+        if value.type in VALUE_TYPES:
+            return value
+        return value.evaluate(state)
+
+    return load
+
+
+def compile_sequence(childs: List[Union[Atom, LList]], tail: bool = False) -> Closure:
+    closures = [compile_node(c) for c in childs[:-1]]
+    closures.append(compile_node(childs[-1], tail))
+    if len(closures) == 1:
+        return closures[0]
+    *init, last = closures
+
+    def sequence(state: Dict) -> Atom:
+        for closure in init:
+            closure(state)
+        return last(state)
+
+    return sequence
+
+
+def action_name(node: LList) -> str:
+    action = node.childs[0]
+    return action.value_str if isinstance(action, Atom) else ""
+
+
+def compile_list(node: LList, tail: bool = False) -> Closure:
+    if not node.childs:
+        return node.evaluate
+    action = node.childs[0]
+    if isinstance(action, LList):
+        return compile_sequence(node.childs, tail)
+    if action.type != NAME:
+        return node.evaluate
+    if action.value_str in NATIVES:
+        return compile_native(node, tail)
+    return compile_operation(node, tail)
+
+
+def compile_operation(node: LList, tail: bool = False) -> Closure:
+    """Compile a builtin, or else a procedure call"""
+    name = action_name(node)
+    if name in COMPILERS:
+        return COMPILERS[name](node, tail)
+    if name in BUILTINS:
+        return compile_builtin(node)
+    return compile_call(node, tail)
+
+
+def compile_native(node: LList, tail: bool = False) -> Closure:
+    """Compile a native, called unless the program binds its name"""
+    name = action_name(node)
+    call = compile_call(node, tail)
+    if type(node.childs[0]) is not Name:
+        return call
+    native = compile_operation(node, tail)
+
+    def native_(state: Dict) -> Any:
+        if name in state:
+            return call(state)
+        return native(state)
+
+    return native_
+
+
+def compile_builtin(node: LList) -> Closure:
+    """
+    Call the builtin with the compiled arguments, which it evaluates as it
+    would evaluate the syntax tree
+    """
+    op = BUILTINS[action_name(node)]
+    if action_name(node) in SPECIAL_FORMS:
+        return lambda state: op(node, state)
+    compiled = LList()
+    compiled.childs = [node.childs[0]]
+    compiled.childs += [Compiled(compile_node(c)) for c in node.childs[1:]]  # type: ignore
+    return lambda state: op(compiled, state)
+
+
+def compile_proc(proc: LList) -> Closure:
+    """Compile the body of a procedure definition"""
+    return compile_sequence(proc.childs[2:], tail=True)
+
+
+def compile_call(node: LList, tail: bool = False) -> Closure:
+    name = action_name(node)
+    head = node.childs[0]
+    args = [compile_node(c) for c in node.childs[1:]]
+
+    def call(state: Dict) -> Union[Atom, TailCall]:
+        if type(head) is Name:
+            try:
+                proc = state[name]
+            except KeyError:
+                raise UndefinedError(f"ERR: Symbol {head} unknown")
+        else:
+            proc = head.lookup(state)  # type: ignore
+        if proc.type != NAME:
+            raise NotCallable(f"{name} not a procedure")
+        definition = proc.value
+        if definition.closure is None:
+            definition.closure = compile_proc(definition)
+        body = definition.closure
+        values = [arg(state) for arg in args]
+        frame = Frame(
+            definition.scope, values, proc.env if proc.env is not None else state
+        )
+        if proc.memo is not None:
+            return proc.memo.call(values, lambda: run(body, frame))
+        if tail:
+            return TailCall(proc, frame)
+        return run(body, frame)
+
+    return call
+
+
+def run(body: Closure, frame: Dict) -> Atom:
+    """Run a procedure body and the tail calls it returns"""
+    result = body(frame)
+    while isinstance(result, TailCall):
+        result = result.proc.value.closure(result.frame)
+    return result
+
+
+def compile_if(node: LList, tail: bool) -> Closure:
+    if len(node.childs) != 4:
+        return compile_builtin(node)
+    test = compile_node(node.childs[1])
+    then, other = (compile_node(c, tail) for c in node.childs[2:])
+
+    def if_(state: Dict) -> Atom:
+        if test(state).value != 0:
+            return then(state)
+        return other(state)
+
+    return if_
+
+
+def compile_var(node: LList, tail: bool) -> Closure:
+    target = node.childs[1]
+    if len(node.childs) != 3 or not isinstance(target, Atom) or target.type != NAME:
+        return compile_builtin(node)
+    value = compile_node(node.childs[2])
+
+    def var(state: Dict) -> Atom:
+        bind(state, target.value, value(state))
+        return target
+
+    return var
+
+
+def compile_binary(
+    op: Callable[[Atom, Atom], Atom],
+) -> Callable[[LList, bool], Closure]:
+    def compiler(node: LList, tail: bool) -> Closure:
+        if len(node.childs) != 3:
+            return compile_builtin(node)
+        left, right = (compile_node(c) for c in node.childs[1:])
+        return lambda state: op(left(state), right(state))
+
+    return compiler
+
+
+def compile_and(node: LList, tail: bool) -> Closure:
+    operands = [compile_node(c) for c in node.childs[1:]]
+
+    def and_(state: Dict) -> Atom:
+        for operand in operands:
+            if not is_true(operand(state)):
+                return FALSE
+        return TRUE
+
+    return and_
+
+
+def compile_or(node: LList, tail: bool) -> Closure:
+    operands = [compile_node(c) for c in node.childs[1:]]
+
+    def or_(state: Dict) -> Atom:
+        for operand in operands:
+            if is_true(operand(state)):
+                return TRUE
+        return FALSE
+
+    return or_
+
+
+def compile_set(node: LList, tail: bool) -> Closure:
+    target = node.childs[1] if len(node.childs) > 1 else None
+    if len(node.childs) != 3 or not isinstance(target, Atom) or target.type != NAME:
+        return compile_builtin(node)
+    value = compile_node(node.childs[2])
+
+    def set_(state: Dict) -> Atom:
+        assign(state, target.value_str, value(state))
+        return target
+
+    return set_
+
+
+def compile_while(node: LList, tail: bool) -> Closure:
+    if len(node.childs) < 2:
+        return compile_builtin(node)
+    test = compile_node(node.childs[1])
+    body = [compile_node(c) for c in node.childs[2:]]
+
+    def while_(state: Dict) -> Atom:
+        while is_true(test(state)):
+            for child in body:
+                child(state)
+        return FALSE
+
+    return while_
+
+
+def compile_loop(name: str) -> Callable[[LList, bool], Closure]:
+    def compiler(node: LList, tail: bool) -> Closure:
+        try:
+            var, bounds = loop_spec(node, name)
+        except ParseError:
+            return compile_builtin(node)
+        limits = [compile_node(c) for c in bounds]
+        body = [compile_node(c) for c in node.childs[2:]]
+
+        def loop(state: Dict) -> Atom:
+            for i in loop_range(name, [limit(state) for limit in limits]):
+                bind(state, var.value_str, Atom.from_value(i))
+                for child in body:
+                    child(state)
+            return FALSE
+
+        return loop
+
+    return compiler
+
+
+COMPILERS: Dict[str, Callable[[LList, bool], Closure]] = {
+    "+": compile_binary(lambda x, y: x.plus(y)),
+    "-": compile_binary(lambda x, y: x.minus(y)),
+    "*": compile_binary(lambda x, y: x.times(y)),
+    "/": compile_binary(lambda x, y: x.divide(y)),
+    "//": compile_binary(lambda x, y: x.divide_int(y)),
+    "%": compile_binary(lambda x, y: x.modulo(y)),
+    "eq": compile_binary(lambda x, y: TRUE if x == y else FALSE),
+    "<": compile_binary(lambda x, y: TRUE if x < y else FALSE),
+    ">": compile_binary(lambda x, y: TRUE if y < x else FALSE),
+    "<=": compile_binary(lambda x, y: TRUE if x < y or x == y else FALSE),
+    ">=": compile_binary(lambda x, y: TRUE if y < x or x == y else FALSE),
+    "and": compile_and,
+    "or": compile_or,
+    "if": compile_if,
+    "var": compile_var,
+    "set!": compile_set,
+    "while": compile_while,
+    "dotimes": compile_loop("dotimes"),
+    "for": compile_loop("for"),
+}
+
+
+def evaluate(node: Union[Atom, LList], state: Dict) -> Atom:
+    """Compile and run a top level form"""
+    return compile_node(node)(state)
@@ -0,0 +1,303 @@
+"""
+Bytecode compiler
+
+LList/Atom trees are compiled into Code objects, flat lists of (opcode,
+argument) instructions run by the stack machine of llisp.vm. Forms the
+compiler does not know are left to the tree walker with EVAL.
+"""
+
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from llisp.lbuiltins import (
+    BUILTINS,
+    FALSE,
+    NATIVES,
+    SPECIAL_FORMS,
+    TRUE,
+    VALUE_TYPES,
+    Atom,
+    LList,
+    Local,
+    Name,
+    ParseError,
+    loop_spec,
+)
+
+NAME = Atom.AtomTypes.NAME
+
+LOAD_CONST = 0  # push the atom argument
+LOAD_NAME = 1  # push the value bound to the name argument
+STORE_NAME = 2  # bind the name of the atom argument to the popped value
+POP = 3  # discard the top of the stack
+JUMP = 4  # continue at the argument
+JUMP_IF_FALSE = 5  # pop, and jump if it is 0 (if condition)
+JUMP_IF_FALSY = 6  # pop, and jump if it is false for std bool
+JUMP_IF_TRUTHY = 7  # pop, and jump if it is true for std bool
+LOAD_PROC = 8  # push the procedure bound to the name argument
+CALL = 9  # call the procedure below the argument count of arguments
+TAIL_CALL = 10  # same as CALL, replacing the current frame
+RETURN = 11  # return the top of the stack to the calling frame
+BINARY_OP = 12  # pop two atoms and push the argument function of them
+CALL_BUILTIN = 13  # pop the arguments of the (builtin, expr, count) argument
+EVAL = 14  # push the argument expression evaluated by the tree walker
+LOAD_FAST = 15  # push the slot of the (index, Local) argument in the frame
+ASSIGN = 16  # update the binding of the name of the atom argument, see set!
+GET_ITER = 17  # pop the bounds of the (loop, count) argument, push their range
+FOR_ITER = 18  # push the next integer of the range below, or pop it and jump
+JUMP_IF_BOUND = 19  # jump to the target of the (name, target) argument if bound
+
+OPNAMES = {
+    value: name
+    for name, value in list(globals().items())
+    if isinstance(value, int) and name.isupper()
+}
+
+Instruction = Tuple[int, Any]
+
+BINARY_OPS: Dict[str, Callable[[Atom, Atom], Atom]] = {
+    "+": lambda x, y: x.plus(y),
+    "-": lambda x, y: x.minus(y),
+    "*": lambda x, y: x.times(y),
+    "/": lambda x, y: x.divide(y),
+    "//": lambda x, y: x.divide_int(y),
+    "%": lambda x, y: x.modulo(y),
+    "eq": lambda x, y: TRUE if x == y else FALSE,
+    "<": lambda x, y: TRUE if x < y else FALSE,
+    ">": lambda x, y: TRUE if y < x else FALSE,
+    "<=": lambda x, y: TRUE if x < y or x == y else FALSE,
+    ">=": lambda x, y: TRUE if y < x or x == y else FALSE,
+}
+
+
+class Code(object):
+    """Instructions of a top level form or of a procedure body"""
+
+    __slots__ = ("instructions",)
+
+    def __init__(self):
+        self.instructions: List[Instruction] = []
+
+    def emit(self, op: int, arg: Any = None) -> int:
+        self.instructions.append((op, arg))
+        return len(self.instructions) - 1
+
+    def patch(self, index: int) -> None:
+        """Make the jump at index continue at the next emitted instruction"""
+        op, _ = self.instructions[index]
+        self.instructions[index] = (op, len(self.instructions))
+
+    def __repr__(self):
+        return "\n".join(
+            f"{i:4} {OPNAMES[op]:<14} {'' if arg is None else arg}"
+            for i, (op, arg) in enumerate(self.instructions)
+        )
+
+
+def action_name(node: LList) -> str:
+    action = node.childs[0]
+    return action.value_str if isinstance(action, Atom) else ""
+
+
+def compile_node(code: Code, node: Union[Atom, LList], tail: bool = False) -> None:
+    if isinstance(node, LList):
+        compile_list(code, node, tail)
+    elif node.type in VALUE_TYPES:
+        code.emit(LOAD_CONST, node)
+    elif isinstance(node, Local) and node.depth == 0:
+        code.emit(LOAD_FAST, (node.index, node))
+    elif node.type == NAME and type(node) is Name:
+        code.emit(LOAD_NAME, node.value_str)
+    else:
+        code.emit(EVAL, node)
+
+
+def compile_sequence(
+    code: Code, childs: List[Union[Atom, LList]], tail: bool = False
+) -> None:
+    for child in childs[:-1]:
+        compile_node(code, child)
+        code.emit(POP)
+    compile_node(code, childs[-1], tail)
+
+
+def compile_list(code: Code, node: LList, tail: bool) -> None:
+    if not node.childs:
+        code.emit(EVAL, node)
+        return
+    action = node.childs[0]
+    if isinstance(action, LList):
+        compile_sequence(code, node.childs, tail)
+    elif action.type != NAME:
+        code.emit(EVAL, node)
+    elif action.value_str in NATIVES:
+        compile_native(code, node, tail)
+    else:
+        compile_operation(code, node, tail)
+
+
+def compile_operation(code: Code, node: LList, tail: bool) -> None:
+    """Compile a builtin, or else a procedure call"""
+    name = action_name(node)
+    if name in COMPILERS:
+        COMPILERS[name](code, node, tail)
+    elif name in BINARY_OPS and len(node.childs) == 3:
+        compile_node(code, node.childs[1])
+        compile_node(code, node.childs[2])
+        code.emit(BINARY_OP, BINARY_OPS[name])
+    elif name in BUILTINS:
+        compile_builtin(code, node)
+    else:
+        compile_call(code, node, tail)
+
+
+def compile_native(code: Code, node: LList, tail: bool) -> None:
+    """Compile a native, called unless the program binds its name"""
+    if type(node.childs[0]) is not Name:
+        compile_call(code, node, tail)
+        return
+    to_call = code.emit(JUMP_IF_BOUND)
+    compile_operation(code, node, tail)
+    to_end = code.emit(JUMP)
+    code.instructions[to_call] = (
+        JUMP_IF_BOUND,
+        (action_name(node), len(code.instructions)),
+    )
+    compile_call(code, node, tail)
+    code.patch(to_end)
+
+
+def compile_builtin(code: Code, node: LList) -> None:
+    """
+    Builtins are called with the expression of their evaluated arguments,
+    special forms with their syntax through the tree walker
+    """
+    if action_name(node) in SPECIAL_FORMS:
+        code.emit(EVAL, node)
+        return
+    for child in node.childs[1:]:
+        compile_node(code, child)
+    op = BUILTINS[action_name(node)]
+    code.emit(CALL_BUILTIN, (op, node.childs[0], len(node.childs) - 1))
+
+
+def compile_call(code: Code, node: LList, tail: bool) -> None:
+    code.emit(LOAD_PROC, node.childs[0])
+    for child in node.childs[1:]:
+        compile_node(code, child)
+    code.emit(TAIL_CALL if tail else CALL, len(node.childs) - 1)
+
+
+def compile_if(code: Code, node: LList, tail: bool) -> None:
+    if len(node.childs) != 4:
+        code.emit(EVAL, node)
+        return
+    compile_node(code, node.childs[1])
+    to_other = code.emit(JUMP_IF_FALSE)
+    compile_node(code, node.childs[2], tail)
+    to_end = code.emit(JUMP)
+    code.patch(to_other)
+    compile_node(code, node.childs[3], tail)
+    code.patch(to_end)
+
+
+def compile_and_or(jump: int, short: Atom, full: Atom):
+    def compiler(code: Code, node: LList, tail: bool) -> None:
+        to_short = []
+        for child in node.childs[1:]:
+            compile_node(code, child)
+            to_short.append(code.emit(jump))
+        code.emit(LOAD_CONST, full)
+        to_end = code.emit(JUMP)
+        for index in to_short:
+            code.patch(index)
+        code.emit(LOAD_CONST, short)
+        code.patch(to_end)
+
+    return compiler
+
+
+def compile_var(code: Code, node: LList, tail: bool) -> None:
+    target = node.childs[1] if len(node.childs) > 1 else None
+    if len(node.childs) != 3 or not isinstance(target, Atom) or target.type != NAME:
+        code.emit(EVAL, node)
+        return
+    compile_node(code, node.childs[2])
+    code.emit(STORE_NAME, target)
+
+
+def compile_set(code: Code, node: LList, tail: bool) -> None:
+    target = node.childs[1] if len(node.childs) > 1 else None
+    if len(node.childs) != 3 or not isinstance(target, Atom) or target.type != NAME:
+        code.emit(EVAL, node)
+        return
+    compile_node(code, node.childs[2])
+    code.emit(ASSIGN, target)
+
+
+def compile_body(code: Code, childs: List[Union[Atom, LList]]) -> None:
+    """Loop body, its values are discarded"""
+    for child in childs:
+        compile_node(code, child)
+        code.emit(POP)
+
+
+def compile_while(code: Code, node: LList, tail: bool) -> None:
+    if len(node.childs) < 2:
+        code.emit(EVAL, node)
+        return
+    start = len(code.instructions)
+    compile_node(code, node.childs[1])
+    to_end = code.emit(JUMP_IF_FALSY)
+    compile_body(code, node.childs[2:])
+    code.emit(JUMP, start)
+    code.patch(to_end)
+    code.emit(LOAD_CONST, FALSE)
+
+
+def compile_loop(name: str):
+    def compiler(code: Code, node: LList, tail: bool) -> None:
+        try:
+            var, bounds = loop_spec(node, name)
+        except ParseError:
+            code.emit(EVAL, node)
+            return
+        for bound in bounds:
+            compile_node(code, bound)
+        code.emit(GET_ITER, (name, len(bounds)))
+        start = code.emit(FOR_ITER)
+        code.emit(STORE_NAME, var)
+        code.emit(POP)
+        compile_body(code, node.childs[2:])
+        code.emit(JUMP, start)
+        code.patch(start)
+        code.emit(LOAD_CONST, FALSE)
+
+    return compiler
+
+
+COMPILERS: Dict[str, Callable[[Code, LList, bool], None]] = {
+    "if": compile_if,
+    "and": compile_and_or(JUMP_IF_FALSY, FALSE, TRUE),
+    "or": compile_and_or(JUMP_IF_TRUTHY, TRUE, FALSE),
+    "var": compile_var,
+    "set!": compile_set,
+    "while": compile_while,
+    "dotimes": compile_loop("dotimes"),
+    "for": compile_loop("for"),
+}
+
+
+def compile_program(node: Union[Atom, LList]) -> Code:
+    """Compile a top level form"""
+    code = Code()
+    compile_node(code, node)
+    code.emit(RETURN)
+    return code
+
+
+def compile_proc(proc: LList) -> Code:
+    """Compile a procedure definition, its body returning from a call"""
+    code = Code()
+    compile_sequence(code, proc.childs[2:], tail=True)
+    code.emit(RETURN)
+    return code
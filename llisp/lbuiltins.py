@@ -1,6 +1,10 @@
-import copy
+import math
+import operator
+import sys
+from collections import OrderedDict
 from enum import Enum
-from typing import Any, Callable, Dict, List, Union
+from itertools import repeat
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 
 class ParseError(Exception):
@@ -15,6 +19,181 @@ class NotCallable(Exception):
     pass
 
 
+class Environment(dict):
+    """
+    Bindings of a scope, chained to the scope it is nested in. Names that are
+    not bound in the scope itself are resolved through its parents, so a call
+    only binds its parameters in a new frame instead of copying the state.
+    """
+
+    def __init__(self, bindings: Optional[Dict] = None, parent: Optional[Dict] = None):
+        super().__init__(bindings or ())
+        self.parent = parent
+
+    def __missing__(self, key: str) -> Any:
+        if self.parent is None:
+            raise KeyError(key)
+        return self.parent[key]
+
+    def __contains__(self, key: object) -> bool:
+        return dict.__contains__(self, key) or (
+            self.parent is not None and key in self.parent
+        )
+
+
+class Unbound(object):
+    """Value of the slot of a local that is not assigned yet"""
+
+    def __reduce__(self):
+        return "UNBOUND"
+
+
+UNBOUND = Unbound()
+
+
+class Scope(object):
+    """
+    Names of the parameters and locals of a procedure, resolved to the
+    slots of its frames when it is defined
+    """
+
+    __slots__ = ("slots", "arity", "padding")
+
+    def __init__(self, params: List[str], local_names: List[str]):
+        names = params + [n for n in local_names if n not in params]
+        self.slots = {name: i for i, name in enumerate(names)}
+        self.arity = len(params)
+        # Slots of the locals, which calls append to the arguments
+        self.padding = [UNBOUND] * (len(names) - len(params))
+
+
+class Frame(Environment):
+    """
+    Environment of a procedure call. Its parameters and locals are stored in
+    a list addressed by the slot indexes resolved at definition time, and
+    remain reachable by name for the builtins that take names.
+    """
+
+    def __init__(self, scope: Scope, args: List, parent: Dict):
+        # The dict itself only holds names bound by dynamic means, it is
+        # left empty
+        self.parent = parent
+        self.scope = scope
+        if len(args) != scope.arity:
+            args = args[: scope.arity]
+            args += [UNBOUND] * (scope.arity - len(args))
+        self.slots = args + scope.padding if scope.padding else args
+
+    def __missing__(self, key: str) -> Any:
+        index = self.scope.slots.get(key)
+        if index is not None and self.slots[index] is not UNBOUND:
+            return self.slots[index]
+        if self.parent is None:
+            raise KeyError(key)
+        return self.parent[key]
+
+    def __contains__(self, key: object) -> bool:
+        index = self.scope.slots.get(key)  # type: ignore
+        if index is not None and self.slots[index] is not UNBOUND:
+            return True
+        return super().__contains__(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        index = self.scope.slots.get(key)
+        if index is None:
+            invalidate_caches()
+            dict.__setitem__(self, key, value)
+        else:
+            self.slots[index] = value
+
+
+class State(Environment):
+    """
+    Global state made of layers. A fork is a new empty layer over its parent:
+    it sees the bindings of the parent and keeps its own writes, so a state
+    is forked in constant time whatever it holds. A frozen layer cannot be
+    written to, and its procedures keep resolving globals in it and not in
+    the forks.
+    """
+
+    def __init__(self, bindings: Optional[Dict] = None, parent: Optional[Dict] = None):
+        super().__init__(bindings, parent)
+        self.frozen = False
+
+    def fork(self, bindings: Optional[Dict] = None) -> "State":
+        return State(bindings, self)
+
+    def freeze(self) -> "State":
+        self.frozen = True
+        return self
+
+    def check_writable(self) -> None:
+        if self.frozen:
+            raise Exception("Cannot bind: frozen state")
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        self.check_writable()
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        self.check_writable()
+        dict.__delitem__(self, key)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        self.check_writable()
+        dict.update(self, *args, **kwargs)
+
+
+# Version of the global bindings, the call sites cache the procedure they
+# call until it changes, and the natives while their name is unbound. The
+# slots of frames are not counted: the calls resolved to a slot, or found by
+# name in a frame, are never cached.
+VERSION = 0
+
+
+def invalidate_caches() -> None:
+    """Make every call site resolve its procedure again"""
+    global VERSION
+    VERSION += 1
+
+
+def bind(state: Dict, name: str, value: Any) -> None:
+    # Only procedures and unbound natives are cached, rebinding a value to a
+    # value changes no call
+    if type(state) is not Frame and (
+        name in NATIVES
+        or isinstance(value, Name)
+        or (name in state and isinstance(state[name], Name))
+    ):
+        invalidate_caches()
+    state[name] = value
+
+
+def assign(state: Dict, name: str, value: Any) -> None:
+    """
+    Update the binding of name in the innermost scope that binds it. A
+    binding of a State layer is shadowed in the innermost State instead, as
+    the layers below it are shared with the other forks.
+    """
+    env: Any = state
+    overlay: Optional[State] = None
+    while env is not None:
+        if type(env) is Frame:
+            index = env.scope.slots.get(name)
+            if index is not None and env.slots[index] is not UNBOUND:
+                env.slots[index] = value
+                return
+        elif overlay is None and isinstance(env, State):
+            overlay = env
+        if dict.__contains__(env, name):
+            if isinstance(env, State):
+                env = overlay
+            bind(env, name, value)
+            return
+        env = getattr(env, "parent", None)
+    raise UndefinedError(f"{name} Undefined")
+
+
 class Atom(object):
     class AtomTypes(Enum):
         NUM = 1
@@ -23,18 +202,75 @@ class Atom(object):
         VAR = 4
         PROC = 5
         LIST = 6
+        VECTOR = 7
+        STRING = 8
+
+    __slots__ = ("value", "type", "value_str")
 
-    value: Any = None
+    value: Any
+    type: "Atom.AtomTypes"
+    value_str: str
 
     def __init__(self, value: Union[str, "LList"]):
         if isinstance(value, str):
             self.value_str = value.strip()
             self.parse()
         else:
-            self.value_str = str(value)
             self.value = value
             self.type = self.AtomTypes.LIST
 
+    @classmethod
+    def from_value(cls, value: Any) -> "Atom":
+        """Wrap a Python value in an Atom without going through its text"""
+        if type(value) is int and SMALL_INT_MIN <= value < SMALL_INT_MAX:
+            return SMALL_INTS[value - SMALL_INT_MIN]
+        if type(value) is str and value in CHARS:
+            return CHARS[value]
+        atom = cls.__new__(cls)
+        atom.value = value
+        if isinstance(value, (int, float)):
+            atom.type = cls.AtomTypes.NUM
+        elif isinstance(value, str) and len(value) != 1:
+            atom.type = cls.AtomTypes.STRING
+        elif isinstance(value, str):
+            atom.type = cls.AtomTypes.CHAR
+            if cls is Atom:
+                CHARS[value] = atom
+        elif isinstance(value, Vector):
+            atom.type = cls.AtomTypes.VECTOR
+        else:
+            atom.type = cls.AtomTypes.LIST
+        return atom
+
+    @classmethod
+    def from_string(cls, value: str) -> "Atom":
+        """Wrap a Python str in a string atom"""
+        atom = cls.__new__(cls)
+        atom.value = value
+        atom.type = cls.AtomTypes.STRING
+        return atom
+
+    def __getattr__(self, name: str) -> Any:
+        # value_str is only computed when needed, as most atoms never print
+        if name == "value_str":
+            self.value_str = str(self.value)
+            return self.value_str
+        raise AttributeError(name)
+
+    def __reduce_ex__(self, protocol):
+        # Values are rebuilt through from_value to keep small ints interned
+        if type(self) is Atom and self.type == self.AtomTypes.STRING:
+            return (Atom.from_string, (self.value,))
+        if type(self) is Atom and self.type in VALUE_TYPES:
+            return (Atom.from_value, (self.value,))
+        return super().__reduce_ex__(protocol)
+
+    def __setstate__(self, state: Any) -> None:
+        # Defined so that unpickling does not go through __getattr__
+        _, slots = state
+        for name, value in slots.items():
+            setattr(self, name, value)
+
     def parse(self):
         if is_int(self.value_str):
             self.value = int(self.value_str)
@@ -55,53 +291,102 @@ class Atom(object):
             raise ParseError(f"Parse ERROR: {self.value_str}")
 
     def evaluate(self, state: Dict) -> "Atom":
-        if self.type in [self.AtomTypes.LIST, self.AtomTypes.NUM, self.AtomTypes.CHAR]:
+        if self.type in VALUE_TYPES:
             return self
 
         raise Exception(f"Cannot evaluate {self}")
 
+    def evaluate_tail(self, state: Dict) -> "Atom":
+        return self.evaluate(state)
+
     # For NUM type
     def plus(self, other: "Atom"):
-        return Atom(str(self.value + other.value))
+        return Atom.from_value(self.value + other.value)
 
     def minus(self, other: "Atom"):
-        return Atom(str(self.value - other.value))
+        return Atom.from_value(self.value - other.value)
 
     def times(self, other: "Atom"):
-        return Atom(str(self.value * other.value))
+        return Atom.from_value(self.value * other.value)
 
     def divide(self, other: "Atom"):
-        return Atom(str(self.value / other.value))
+        return Atom.from_value(self.value / other.value)
 
     def divide_int(self, other: "Atom"):
-        return Atom(str(self.value // other.value))
+        return Atom.from_value(self.value // other.value)
 
     # Primitives for every Atom
     def __eq__(self, other):
-        return self.type == other.type and self.value == other.value
+        if self.type == other.type:
+            return self.value == other.value
+        return string_equals_list(self, other)
 
     def __lt__(self, other):
         return self.type == other.type and self.value < other.value
 
     def modulo(self, other):
-        return Atom(str(self.value % other.value))
+        return Atom.from_value(self.value % other.value)
 
     def __repr__(self):
         return f"({self.type}) {self.value}"
 
 
+VALUE_TYPES = (
+    Atom.AtomTypes.NUM,
+    Atom.AtomTypes.LIST,
+    Atom.AtomTypes.CHAR,
+    Atom.AtomTypes.VECTOR,
+    Atom.AtomTypes.STRING,
+)
+
+
+def string_equals_list(a: Atom, b: Atom) -> bool:
+    """A string is equal to the list of its chars, as string literals were"""
+    if a.type == Atom.AtomTypes.LIST and b.type == Atom.AtomTypes.STRING:
+        a, b = b, a
+    if a.type != Atom.AtomTypes.STRING or b.type != Atom.AtomTypes.LIST:
+        return False
+    return len(a.value) == len(b.value) and all(
+        c.type == Atom.AtomTypes.CHAR and c.value == char
+        for char, c in zip(a.value, b.value)
+    )
+
+
+# Interned atoms for small integers, shared by every arithmetic result
+SMALL_INT_MIN = -5
+SMALL_INT_MAX = 257
+SMALL_INTS: List[Atom] = []
+for i in range(SMALL_INT_MIN, SMALL_INT_MAX):
+    small_int = Atom.__new__(Atom)
+    small_int.value = i
+    small_int.type = Atom.AtomTypes.NUM
+    SMALL_INTS.append(small_int)
+
+TRUE = Atom.from_value(1)
+FALSE = Atom.from_value(0)
+
+# Interned atoms for chars, as strings are lists of them
+CHARS: Dict[str, Atom] = {}
+
+
 class Name(Atom):
+    __slots__ = ("name", "params", "env", "memo")
+
     def __init__(
         self,
         name: str,
         body: Union[Atom, "LList", None] = None,
         params: Union["LList", None] = None,
+        env: Optional[Dict] = None,
     ):
         self.name = name
         self.params = params
         self.value = body
+        self.env = env
         self.value_str = name
         self.type = self.AtomTypes.NAME
+        # Cache of the procedure results, see memoize
+        self.memo: Optional[Memo] = None
 
     def evaluate(self, state: Dict) -> Atom:
         """
@@ -112,33 +397,184 @@ class Name(Atom):
             return state[self.name].evaluate(state)
         raise UndefinedError(f"{self.name} Undefined")
 
-    def call_proc(self, state: Dict, sub_state: Dict) -> Atom:
-        temp_state = {**state, **sub_state}
-        if isinstance(self.value, LList):
-            for child in self.value.childs[2:]:
-                result = child.evaluate(temp_state)
+    def frame(self, state: Dict, args: List[Atom]) -> "Frame":
+        """
+        Create the frame of a call, holding the arguments and chained to the
+        environment the procedure was defined in
+        """
+        return Frame(
+            self.value.scope, args, self.env if self.env is not None else state
+        )
+
+    def run_body(self, frame: Environment) -> Union[Atom, "TailCall"]:
+        *init, last = self.value.childs[2:]
+        for child in init:
+            child.evaluate(frame)
+        return last.evaluate_tail(frame)
+
+    def call_proc(self, state: Dict, args: List[Atom]) -> Atom:
+        """
+        Run the procedure body. Calls in tail position of the body are
+        returned as TailCall and run by this same loop, so that tail
+        recursion runs in constant Python stack.
+        """
+        if self.memo is not None:
+            return self.memo.call(args, lambda: self.run_proc(state, args))
+        return self.run_proc(state, args)
+
+    def run_proc(self, state: Dict, args: List[Atom]) -> Atom:
+        result = self.run_body(self.frame(state, args))
+        while isinstance(result, TailCall):
+            result = result.proc.run_body(result.frame)
+        return result
+
+
+class Local(Name):
+    """
+    Reference to a parameter or local of a procedure, in the frame depth
+    levels above the current one
+    """
+
+    __slots__ = ("depth", "index")
+
+    def __init__(self, name: str, depth: int, index: int):
+        super().__init__(name)
+        self.value = name
+        self.depth = depth
+        self.index = index
+
+    def lookup(self, state: Dict) -> Atom:
+        frame: Any = state
+        for _ in range(self.depth):
+            frame = frame.parent
+        value = frame.slots[self.index]
+        if value is UNBOUND:
+            # Not assigned yet in this frame, resolved as before its var
+            try:
+                return frame.parent[self.name]
+            except KeyError:
+                raise UndefinedError(f"{self.name} Undefined")
+        return value
+
+    def evaluate(self, state: Dict) -> Atom:
+        value = self.lookup(state)
+        if value.type in VALUE_TYPES:
+            return value
+        return value.evaluate(state)
+
+
+class Global(Name):
+    """
+    Reference to a name outside of every enclosing procedure, looked up
+    directly in the environment depth levels above the current frame
+    """
+
+    __slots__ = ("depth",)
+
+    def __init__(self, name: str, depth: int):
+        super().__init__(sys.intern(name))
+        self.value = self.name
+        self.depth = depth
+
+    def lookup(self, state: Dict) -> Atom:
+        env: Any = state
+        for _ in range(self.depth):
+            env = env.parent
+        try:
+            return env[self.name]
+        except KeyError:
+            raise UndefinedError(f"{self.name} Undefined")
+
+    def evaluate(self, state: Dict) -> Atom:
+        value = self.lookup(state)
+        if value.type in VALUE_TYPES:
+            return value
+        return value.evaluate(state)
+
+
+class TailCall(object):
+    """A procedure call in tail position, left to the caller to run"""
+
+    __slots__ = ("proc", "frame")
+
+    def __init__(self, proc: Name, frame: Environment):
+        self.proc = proc
+        self.frame = frame
+
+
+def memo_key(atom: Atom) -> Any:
+    """Hashable key of an argument, lists and vectors are keyed by content"""
+    if atom.type == Atom.AtomTypes.LIST:
+        return (atom.type, tuple(memo_key(a) for a in atom.value))
+    if atom.type == Atom.AtomTypes.VECTOR:
+        return (atom.type, tuple(memo_key(Vector.atom(a)) for a in atom.value.items))
+    if atom.type == Atom.AtomTypes.NAME:
+        return (atom.type, id(atom))
+    return (atom.type, atom.value)
+
+
+class Memo(object):
+    """
+    Results of a procedure keyed on its arguments, the least recently used
+    ones are evicted past maxsize
+    """
+
+    DEFAULT_MAXSIZE = 1024
+
+    def __init__(self, maxsize: int = DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.cache: "OrderedDict[Any, Atom]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def call(self, args: Iterable[Atom], run: Callable[[], Atom]) -> Atom:
+        key = tuple(memo_key(a) for a in args)
+        try:
+            result = self.cache[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return result
+        self.misses += 1
+        result = run()
+        self.cache[key] = result
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
         return result
 
+    def clear(self) -> None:
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self.cache),
+            "maxsize": self.maxsize,
+        }
+
+
+def memoize(proc: Name, maxsize: int = Memo.DEFAULT_MAXSIZE) -> Name:
+    """Cache the results of a procedure, replacing any previous cache"""
+    if proc.type != Atom.AtomTypes.NAME or proc.params is None:
+        raise NotCallable(f"{proc.value_str} not a procedure")
+    if maxsize < 1:
+        raise ValueError(f"Memoize size must be positive, got {maxsize}")
+    proc.memo = Memo(maxsize)
+    return proc
+
 
 def create_atom(value: str) -> Union["Atom", "Name"]:
     atom = Atom(value)
-    if is_int(value):
-        atom.value = int(value)
-        atom.type = atom.AtomTypes.NUM
-    elif is_float(value):
-        atom.value = float(value)
-        atom.type = atom.AtomTypes.NUM
-    elif is_char(value):
-        iner_char = bytes(value[1:-1], "utf-8").decode("unicode_escape")
-        if len(iner_char) > 1:
-            raise ParseError(f"Parse ERROR: {value} is not a CHAR")
-        atom.value = iner_char
-        atom.type = atom.AtomTypes.CHAR
-    elif is_name(value):
-        atom = Name(value)
-        atom.value = atom.value_str
-        atom.type = atom.AtomTypes.NAME
-    return atom
+    if atom.type == atom.AtomTypes.NAME:
+        name = Name(sys.intern(atom.value_str))
+        name.value = name.value_str
+        return name
+    return Atom.from_value(atom.value)
 
 
 # Parsing functions
@@ -194,10 +630,78 @@ class Program(object):
 
 
 class LList(object):
+    __slots__ = ("childs", "closure", "code", "scope", "cache")
+
     def __init__(self):
         self.childs: List[Union[LList, Atom]] = []
+        # Compiled forms of a procedure definition, see llisp.closures and
+        # llisp.compiler
+        self.closure: Optional[Callable] = None
+        self.code: Any = None
+        # Frame slots of a procedure definition, see resolve
+        self.scope: Optional[Scope] = None
+        # Target of the call, see cache_builtin and cache_proc
+        self.cache: Optional[tuple] = None
+
+    def __getstate__(self):
+        # Compiled forms are not pickled, they are compiled again on demand
+        return self.childs, self.scope
+
+    def __setstate__(self, state):
+        self.childs, self.scope = state
+        self.closure = None
+        self.code = None
+        self.cache = None
+
+    def cache_builtin(self, name: str, state: Dict) -> None:
+        op = BUILTINS[name]
+        if name not in NATIVES:
+            self.cache = (VERSION, 0, None, op, TAIL_BUILTINS.get(name, op))
+            return
+        # Called while the name is unbound, in the globals reached through the
+        # frames: a depth of -1 walks the frames up to them
+        env: Any = state
+        while type(env) is Frame:
+            if name in env.scope.slots:
+                return
+            env = env.parent
+        self.cache = (VERSION, -1, env, op, TAIL_BUILTINS.get(name, op))
+
+    def cache_proc(self, action: Atom, proc: Atom, state: Dict) -> None:
+        """
+        Cache the procedure called, with the environment it was found in:
+        the same body can run in several states
+        """
+        if not isinstance(proc, Name) or type(action) is Local:
+            return
+        depth = getattr(action, "depth", 0)
+        env: Any = state
+        for _ in repeat(None, depth):
+            env = env.parent
+        if type(env) is Frame:
+            # Found by name in a frame, whose slots may be rebound
+            return
+        self.cache = (VERSION, depth, env, proc, proc)
 
     def evaluate(self, state: Union[Dict]) -> Atom:
+        cache = self.cache
+        if cache is not None and cache[0] == VERSION:
+            if cache[2] is None:
+                return cache[3](self, state)
+            env: Any = state
+            if cache[1] < 0:
+                while type(env) is Frame:
+                    env = env.parent
+                if env is cache[2]:
+                    return cache[3](self, state)
+            else:
+                for _ in repeat(None, cache[1]):
+                    env = env.parent
+                if env is cache[2]:
+                    return cache[3].call_proc(
+                        state, [c.evaluate(state) for c in self.childs[1:]]
+                    )
+
         action = self.childs[0]
         if isinstance(action, LList):
             # If the childs are LList that means that we want to execute them
@@ -208,10 +712,64 @@ class LList(object):
                 result = child.evaluate(state)
             return result
         if action.type == Atom.AtomTypes.NAME:
-            if action.value_str in BUILTINS:
+            if calls_builtin(action, state):
+                self.cache_builtin(action.value_str, state)
                 return BUILTINS[action.value_str](self, state)
+            elif type(action) is not Name:
+                # Resolved reference, see resolve
+                proc = action.lookup(state)
+                self.cache_proc(action, proc, state)
+                return apply_proc(proc, action.value_str, self, state)
             elif action.value_str in state:
-                return custom_op(action.value_str, self, state)
+                proc = state[action.value_str]
+                self.cache_proc(action, proc, state)
+                return apply_proc(proc, action.value_str, self, state)
+
+        raise UndefinedError(f"ERR: Symbol {action} unknown")
+
+    def evaluate_tail(self, state: Dict) -> Union[Atom, TailCall]:
+        """
+        Evaluate the expression in tail position of a procedure body: a call
+        to a procedure is not made but returned as a TailCall
+        """
+        cache = self.cache
+        if cache is not None and cache[0] == VERSION:
+            if cache[2] is None:
+                return cache[4](self, state)
+            env: Any = state
+            if cache[1] < 0:
+                while type(env) is Frame:
+                    env = env.parent
+                if env is cache[2]:
+                    return cache[4](self, state)
+            else:
+                for _ in repeat(None, cache[1]):
+                    env = env.parent
+                if env is cache[2]:
+                    proc = cache[4]
+                    args = [c.evaluate(state) for c in self.childs[1:]]
+                    if proc.memo is not None:
+                        return proc.call_proc(state, args)
+                    return TailCall(proc, proc.frame(state, args))
+
+        action = self.childs[0]
+        if isinstance(action, LList):
+            for child in self.childs[:-1]:
+                child.evaluate(state)
+            return self.childs[-1].evaluate_tail(state)
+        if action.type == Atom.AtomTypes.NAME:
+            if calls_builtin(action, state):
+                name = action.value_str
+                self.cache_builtin(name, state)
+                return TAIL_BUILTINS.get(name, BUILTINS[name])(self, state)
+            elif type(action) is not Name:
+                proc = action.lookup(state)
+                self.cache_proc(action, proc, state)
+                return tail_apply(proc, action.value_str, self, state)
+            elif action.value_str in state:
+                proc = state[action.value_str]
+                self.cache_proc(action, proc, state)
+                return tail_apply(proc, action.value_str, self, state)
 
         raise UndefinedError(f"ERR: Symbol {action} unknown")
 
@@ -227,6 +785,96 @@ class LList(object):
         return str(self.childs)
 
 
+class Cons(object):
+    """
+    Immutable list made of cells holding an element and the rest of the
+    list. Lists share their tails, so push, pop and el are O(1) and lists are
+    never copied. It compares and prints as the LList of its elements.
+    """
+
+    __slots__ = ("head", "tail", "length")
+
+    def __init__(self, head: Optional[Atom], tail: Optional["Cons"]):
+        self.head = head
+        self.tail = tail
+        self.length: int = tail.length + 1 if tail is not None else 0
+
+    @classmethod
+    def from_iterable(cls, elements: Iterable[Atom]) -> "Cons":
+        cons = EMPTY
+        for e in reversed(list(elements)):
+            cons = cls(e, cons)
+        return cons
+
+    @property
+    def childs(self) -> List[Atom]:
+        return list(self)
+
+    def __iter__(self) -> Iterator[Atom]:
+        cons = self
+        while cons.length:
+            yield cons.head  # type: ignore
+            cons = cons.tail  # type: ignore
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, Cons):
+            return NotImplemented
+        if len(self) != len(other):
+            return False
+        for s, o in zip(self, other):
+            if s != o:
+                return False
+        return True
+
+    def __reduce__(self):
+        return (Cons.from_iterable, (list(self),))
+
+    def __repr__(self):
+        return str(list(self))
+
+
+EMPTY = Cons(None, None)
+
+
+class Vector(object):
+    """
+    Mutable array with O(1) indexing. Numbers are kept as plain Python
+    values, so that bulk numeric builtins run over them in a single call,
+    and other elements as their atoms.
+    """
+
+    __slots__ = ("items",)
+
+    def __init__(self, items: List[Any]):
+        self.items = items
+
+    @staticmethod
+    def item(atom: Atom) -> Any:
+        """Element stored for the atom"""
+        return atom.value if atom.type == Atom.AtomTypes.NUM else atom
+
+    @staticmethod
+    def atom(item: Any) -> Atom:
+        """Atom of a stored element"""
+        return item if isinstance(item, Atom) else Atom.from_value(item)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __eq__(self, other):
+        if not isinstance(other, Vector):
+            return NotImplemented
+        return self.items == other.items
+
+    def __repr__(self):
+        return f"#{[Vector.atom(v) for v in self.items]}"
+
+
 def plus_op(expr: "LList", state: Dict) -> "Atom":
     x = expr.childs[1].evaluate(state)
     for y in expr.childs[2:]:
@@ -276,30 +924,38 @@ def if_op(expr: "LList", state: Dict) -> "Atom":
         return expr.childs[3].evaluate(state)
 
 
+def if_tail_op(expr: "LList", state: Dict) -> Union[Atom, TailCall]:
+    req = expr.childs[1].evaluate(state)
+    if req.value != 0:
+        return expr.childs[2].evaluate_tail(state)
+    else:
+        return expr.childs[3].evaluate_tail(state)
+
+
 def eq_op(expr: "LList", state: Dict) -> "Atom":
     left = expr.childs[1].evaluate(state)
     right = expr.childs[2].evaluate(state)
     if left == right:
-        return Atom("1")
+        return TRUE
     else:
-        return Atom("0")
+        return FALSE
 
 
 def not_op(expr: "LList", state: Dict) -> "Atom":
     left = expr.childs[1].evaluate(state)
     if left.value == 0:
-        return Atom("1")
+        return TRUE
     else:
-        return Atom("0")
+        return FALSE
 
 
 def less_op(expr: "LList", state: Dict) -> "Atom":
     left = expr.childs[1].evaluate(state)
     right = expr.childs[2].evaluate(state)
     if isinstance(left, Atom) and left < right:
-        return Atom("1")
+        return TRUE
     else:
-        return Atom("0")
+        return FALSE
 
 
 def var_op(expr: "LList", state: Dict) -> "Atom":
@@ -308,7 +964,7 @@ def var_op(expr: "LList", state: Dict) -> "Atom":
         and isinstance(expr.childs[1], Atom)
         and expr.childs[1].type == Atom.AtomTypes.NAME
     ):
-        state[expr.childs[1].value] = expr.childs[2].evaluate(state)
+        bind(state, expr.childs[1].value, expr.childs[2].evaluate(state))
         # print(f"<<< {expr.childs[1].value} = {expr.childs[2]}")
         return expr.childs[1]
     else:
@@ -325,24 +981,315 @@ def def_op(expr: "LList", state: Dict) -> Atom:
         if not isinstance(name, Atom):
             raise ParseError(f"Parse error: Unexpected format of function name f{name}")
 
-        a = Name(name.value, body, params)
-        state[name.value] = a
+        if body.scope is None:
+            body.scope = resolve(body, state)
+        a = Name(name.value, body, params, state)
+        bind(state, name.value, a)
         # print(f"<<< ({a} {a.params})")
         return name
     raise ParseError("Parse error: Unexpected format")
 
 
+def set_op(expr: "LList", state: Dict) -> "Atom":
+    if (
+        len(expr.childs) == 3
+        and isinstance(expr.childs[1], Atom)
+        and expr.childs[1].type == Atom.AtomTypes.NAME
+    ):
+        assign(state, expr.childs[1].value_str, expr.childs[2].evaluate(state))
+        return expr.childs[1]
+    raise ParseError("Parse error: usage (set! name value)")
+
+
+def while_op(expr: "LList", state: Dict) -> "Atom":
+    if len(expr.childs) < 2:
+        raise ParseError("Parse error: usage (while test body...)")
+    test = expr.childs[1]
+    body = expr.childs[2:]
+    while is_true(test.evaluate(state)):
+        for child in body:
+            child.evaluate(state)
+    return FALSE
+
+
+LOOP_USAGE = {
+    "dotimes": "(dotimes (i n) body...)",
+    "for": "(for (i from to step) body...)",
+}
+
+
+def loop_spec(expr: "LList", name: str) -> Tuple[Atom, List[Any]]:
+    """Variable and bound expressions of a dotimes or for loop"""
+    spec = expr.childs[1] if len(expr.childs) > 1 else None
+    counts = (1,) if name == "dotimes" else (2, 3)
+    if isinstance(spec, LList) and len(spec.childs) - 1 in counts:
+        var = spec.childs[0]
+        if isinstance(var, Atom) and var.type == Atom.AtomTypes.NAME:
+            return var, spec.childs[1:]
+    raise ParseError(f"Parse error: usage {LOOP_USAGE[name]}")
+
+
+def loop_range(name: str, bounds: List[Atom]) -> range:
+    """Integers taken by the variable of a loop, as the Python range"""
+    if any(bound.type != Atom.AtomTypes.NUM for bound in bounds):
+        raise Exception(f"Cannot {name}: not a number")
+    try:
+        return range(*(int(bound.value) for bound in bounds))
+    except ValueError:
+        raise Exception(f"Cannot {name}: step is 0")
+
+
+def loop_op(name: str) -> Callable[["LList", Dict], Atom]:
+    def op(expr: "LList", state: Dict) -> Atom:
+        var, bounds = loop_spec(expr, name)
+        body = expr.childs[2:]
+        for i in loop_range(name, [bound.evaluate(state) for bound in bounds]):
+            bind(state, var.value_str, Atom.from_value(i))
+            for child in body:
+                child.evaluate(state)
+        return FALSE
+
+    return op
+
+
+# Leading children of the special forms that are syntax and not references,
+# None when the whole form is
+SYNTAX_CHILDS: Dict[str, Optional[int]] = {
+    "var": 2,
+    "def": None,
+    "defmemo": None,
+    "memoize": 2,
+    "memo-clear": 2,
+    "memo-stats": 2,
+    "pmap": 2,
+    "pfor": 2,
+    "set!": 2,
+    "dotimes": 2,
+    "for": 2,
+}
+
+
+def syntax_childs(node: "LList") -> Optional[int]:
+    action = node.childs[0]
+    if isinstance(action, Atom) and action.type == Atom.AtomTypes.NAME:
+        if action.value_str in BUILTINS:
+            return SYNTAX_CHILDS.get(action.value_str, 1)
+    return 0
+
+
+def calls_builtin(action: Atom, state: Dict) -> bool:
+    """
+    Whether a form headed by the name action calls the builtin of the name:
+    natives are called only while the program does not bind their name
+    """
+    name = action.value_str
+    if name not in BUILTINS:
+        return False
+    return name not in NATIVES or (type(action) is Name and name not in state)
+
+
+def local_names(node: Union[Atom, "LList"], names: List[str]) -> None:
+    """
+    Names assigned by var, def or as loop variables in a body, outside of
+    nested definitions
+    """
+    if not isinstance(node, LList) or not node.childs:
+        return
+    action = node.childs[0]
+    target = node.childs[1] if len(node.childs) > 1 else None
+    if isinstance(action, Atom) and action.value_str in ("def", "defmemo"):
+        if isinstance(target, LList) and target.childs:
+            if isinstance(target.childs[0], Atom):
+                names.append(target.childs[0].value_str)
+        return
+    if isinstance(action, Atom) and action.value_str == "var":
+        if isinstance(target, Atom):
+            names.append(target.value_str)
+    if isinstance(action, Atom) and action.value_str in ("dotimes", "for"):
+        if isinstance(target, LList) and target.childs:
+            if isinstance(target.childs[0], Atom):
+                names.append(target.childs[0].value_str)
+    for child in node.childs:
+        local_names(child, names)
+
+
+def resolve_refs(node: Union[Atom, "LList"], scopes: List[Scope]) -> Any:
+    """Replace the names referenced in node by their Local or Global address"""
+    if isinstance(node, LList):
+        if node.childs:
+            start = syntax_childs(node)
+            action = node.childs[0]
+            if (
+                start
+                and isinstance(action, Atom)
+                and action.value_str in NATIVES
+                and any(action.value_str in scope.slots for scope in scopes)
+            ):
+                # Native shadowed by a local, called as a procedure
+                start = 0
+            if start is not None:
+                for i in range(start, len(node.childs)):
+                    node.childs[i] = resolve_refs(node.childs[i], scopes)
+            spec = node.childs[1] if len(node.childs) > 1 else None
+            if (
+                start
+                and isinstance(action, Atom)
+                and action.value_str in LOOP_USAGE
+                and isinstance(spec, LList)
+            ):
+                # Bounds of a loop, after its variable
+                for i in range(1, len(spec.childs)):
+                    spec.childs[i] = resolve_refs(spec.childs[i], scopes)
+        return node
+    if type(node) is not Name or node.type != Atom.AtomTypes.NAME:
+        return node
+    for depth, scope in enumerate(scopes):
+        if node.value_str in scope.slots:
+            return Local(node.value_str, depth, scope.slots[node.value_str])
+    return Global(node.value_str, len(scopes))
+
+
+def resolve(definition: "LList", state: Dict) -> Scope:
+    """
+    Resolve the references of the body of a procedure definition to the
+    slots of its frame and of the frames it is nested in
+    """
+    params = [
+        p.value_str for p in definition.childs[1].childs[1:] if isinstance(p, Atom)
+    ]
+    names: List[str] = []
+    for child in definition.childs[2:]:
+        local_names(child, names)
+    scope = Scope(params, names)
+
+    scopes = [scope]
+    env: Optional[Dict] = state
+    while isinstance(env, Frame):
+        scopes.append(env.scope)
+        env = env.parent
+    for i in range(2, len(definition.childs)):
+        definition.childs[i] = resolve_refs(definition.childs[i], scopes)
+    return scope
+
+
+def bind_args(proc: Name, expr: "LList", state: Dict) -> List[Atom]:
+    return [c.evaluate(state) for c in expr.childs[1:]]
+
+
 def custom_op(name: str, expr: "LList", state: Dict) -> "Atom":
-    proc = state[name]
-    if proc.type == Atom.AtomTypes.NAME:
-        sub_state: Dict[str, Union[LList, Atom]] = {}
-        for p, c in zip(proc.params.childs, expr.childs[1:]):
-            sub_state[p.value_str] = c.evaluate(state)
-        # print(f"Evaluating {proc} with {state} and {sub_state}")
-        return proc.call_proc(state, sub_state)
+    return apply_proc(state[name], name, expr, state)
+
+
+def apply_proc(proc: Atom, name: str, expr: "LList", state: Dict) -> "Atom":
+    if isinstance(proc, Name):
+        return proc.call_proc(state, bind_args(proc, expr, state))
     raise NotCallable(f"{name} not a procedure")
 
 
+def tail_call(name: str, expr: "LList", state: Dict) -> Union[Atom, TailCall]:
+    return tail_apply(state[name], name, expr, state)
+
+
+def tail_apply(
+    proc: Atom, name: str, expr: "LList", state: Dict
+) -> Union[Atom, TailCall]:
+    if isinstance(proc, Name):
+        if proc.memo is not None:
+            # The result has to be stored before returning
+            return proc.call_proc(state, bind_args(proc, expr, state))
+        return TailCall(proc, proc.frame(state, bind_args(proc, expr, state)))
+    raise NotCallable(f"{name} not a procedure")
+
+
+def memo_name(expr: "LList", state: Dict) -> Atom:
+    name = expr.childs[1] if len(expr.childs) > 1 else None
+    if not isinstance(name, Atom) or name.type != Atom.AtomTypes.NAME:
+        raise ParseError(f"Parse error: {expr.childs[0]} expects a procedure name")
+    if name.value_str not in state:
+        raise UndefinedError(f"{name.value_str} Undefined")
+    return name
+
+
+def own_proc(name: str, state: Dict) -> Any:
+    """
+    Procedure bound to name, to be modified in place. A procedure of a State
+    layer below the innermost one is shared with the other forks of the
+    layer, it is copied into the innermost layer first.
+    """
+    proc = state[name]
+    env: Any = state
+    overlay: Optional[State] = None
+    while env is not None and not dict.__contains__(env, name):
+        if type(env) is Frame:
+            index = env.scope.slots.get(name)
+            if index is not None and env.slots[index] is not UNBOUND:
+                return proc
+        if overlay is None and isinstance(env, State):
+            overlay = env
+        env = getattr(env, "parent", None)
+    if not isinstance(env, State) or overlay is None or not isinstance(proc, Name):
+        return proc
+    # The copy resolves its globals in the layer it is bound in, its
+    # recursive calls included
+    copy = Name(proc.name, proc.value, proc.params, overlay)
+    if proc.memo is not None:
+        copy.memo = Memo(proc.memo.maxsize)
+    bind(overlay, name, copy)
+    return copy
+
+
+def memo_of(name: Atom, state: Dict) -> Memo:
+    proc = state[name.value_str]
+    if proc.type != Atom.AtomTypes.NAME or proc.memo is None:
+        raise NotCallable(f"{name.value_str} not a memoized procedure")
+    return proc.memo
+
+
+def memoize_op(expr: "LList", state: Dict) -> "Atom":
+    name = memo_name(expr, state)
+    maxsize = Memo.DEFAULT_MAXSIZE
+    if len(expr.childs) > 2:
+        maxsize = expr.childs[2].evaluate(state).value
+    memoize(own_proc(name.value_str, state), maxsize)
+    return name
+
+
+def defmemo_op(expr: "LList", state: Dict) -> "Atom":
+    name = def_op(expr, state)
+    memoize(state[name.value])
+    return name
+
+
+def memo_clear_op(expr: "LList", state: Dict) -> "Atom":
+    name = memo_name(expr, state)
+    memo_of(name, state)
+    own_proc(name.value_str, state)
+    memo_of(name, state).clear()
+    return name
+
+
+def memo_stats_op(expr: "LList", state: Dict) -> "Atom":
+    stats = memo_of(memo_name(expr, state), state).stats()
+    return Atom.from_value(
+        Cons.from_iterable(
+            Atom.from_value(stats[k]) for k in ("hits", "misses", "size", "maxsize")
+        )
+    )
+
+
+def pmap_op(expr: "LList", state: Dict) -> "Atom":
+    # Imported here as the process pool depends on this module
+    from llisp import parallel
+
+    return parallel.pmap(expr, state)
+
+
+def pfor_op(expr: "LList", state: Dict) -> "Atom":
+    from llisp import parallel
+
+    return parallel.pfor(expr, state)
+
+
 def echo_op(expr: "LList", state: Dict) -> "Atom":
     e = expr.childs[1].evaluate(state)
     print(e.value, end="", flush=True)
@@ -356,39 +1303,276 @@ def print_op(expr: "LList", state: Dict) -> "Atom":
 
 
 def list_op(expr: "LList", state: Dict) -> "Atom":
-    new_list = LList()
-    if len(expr.childs) > 1:
-        for c in expr.childs[1:]:
-            new_list.childs.append(copy.deepcopy(c).evaluate(state))
-    return Atom(new_list)
+    return Atom.from_value(
+        Cons.from_iterable(c.evaluate(state) for c in expr.childs[1:])
+    )
 
 
 def push_op(expr: "LList", state: Dict) -> "Atom":
     e = expr.childs[1].evaluate(state)
     old_list = expr.childs[2].evaluate(state)
-    new_list = LList()
-    new_list.childs.append(copy.deepcopy(e))
     if isinstance(old_list, Atom) and old_list.type == old_list.AtomTypes.LIST:
-        for c in old_list.value.childs:
-            new_list.childs.append(copy.deepcopy(c))
-    else:
-        raise Exception("Cannot push: not a list")
-
-    return Atom(new_list)
+        return Atom.from_value(Cons(e, old_list.value))
+    if old_list.type == Atom.AtomTypes.STRING and e.type == Atom.AtomTypes.CHAR:
+        return Atom.from_string(e.value + old_list.value)
+    raise Exception("Cannot push: not a list")
 
 
 def pop_op(expr: "LList", state: Dict) -> "Atom":
     old_list = expr.childs[1].evaluate(state)
-    new_list = LList()
     if isinstance(old_list, Atom) and old_list.type == old_list.AtomTypes.LIST:
-        for c in old_list.value.childs[1:]:
-            new_list.childs.append(copy.deepcopy(c))
-
-    return Atom(new_list)
+        if old_list.value.length:
+            return Atom.from_value(old_list.value.tail)
+    if old_list.type == Atom.AtomTypes.STRING:
+        return Atom.from_string(old_list.value[1:])
+    return Atom.from_value(EMPTY)
 
 
 def el_op(expr: "LList", state: Dict) -> "Atom":
-    return expr.childs[1].evaluate(state).value.childs[0].evaluate(state)
+    old_list = expr.childs[1].evaluate(state)
+    if old_list.type == Atom.AtomTypes.STRING:
+        if not old_list.value:
+            raise IndexError("Cannot el: empty string")
+        return Atom.from_value(old_list.value[0])
+    if not old_list.value.length:
+        raise IndexError("Cannot el: empty list")
+    return old_list.value.head
+
+
+# Native versions of std.lisp functions, which remain defined there
+
+
+def is_true(atom: Atom) -> bool:
+    """Truth value of an atom, as computed by std bool"""
+    return atom.type != Atom.AtomTypes.NUM or atom.value != 0
+
+
+def bool_op(expr: "LList", state: Dict) -> "Atom":
+    return TRUE if is_true(expr.childs[1].evaluate(state)) else FALSE
+
+
+def bang_op(expr: "LList", state: Dict) -> "Atom":
+    return FALSE if is_true(expr.childs[1].evaluate(state)) else TRUE
+
+
+def and_op(expr: "LList", state: Dict) -> "Atom":
+    for c in expr.childs[1:]:
+        if not is_true(c.evaluate(state)):
+            return FALSE
+    return TRUE
+
+
+def or_op(expr: "LList", state: Dict) -> "Atom":
+    for c in expr.childs[1:]:
+        if is_true(c.evaluate(state)):
+            return TRUE
+    return FALSE
+
+
+def xor_op(expr: "LList", state: Dict) -> "Atom":
+    left = is_true(expr.childs[1].evaluate(state))
+    right = is_true(expr.childs[2].evaluate(state))
+    return TRUE if left != right else FALSE
+
+
+def greater_op(expr: "LList", state: Dict) -> "Atom":
+    left = expr.childs[1].evaluate(state)
+    right = expr.childs[2].evaluate(state)
+    return TRUE if right < left else FALSE
+
+
+def less_eq_op(expr: "LList", state: Dict) -> "Atom":
+    left = expr.childs[1].evaluate(state)
+    right = expr.childs[2].evaluate(state)
+    return TRUE if left < right or left == right else FALSE
+
+
+def greater_eq_op(expr: "LList", state: Dict) -> "Atom":
+    left = expr.childs[1].evaluate(state)
+    right = expr.childs[2].evaluate(state)
+    return TRUE if right < left or left == right else FALSE
+
+
+def min_op(expr: "LList", state: Dict) -> "Atom":
+    left = expr.childs[1].evaluate(state)
+    right = expr.childs[2].evaluate(state)
+    return left if left < right else right
+
+
+def max_op(expr: "LList", state: Dict) -> "Atom":
+    left = expr.childs[1].evaluate(state)
+    right = expr.childs[2].evaluate(state)
+    return right if left < right else left
+
+
+def abs_op(expr: "LList", state: Dict) -> "Atom":
+    x = expr.childs[1].evaluate(state)
+    return x if FALSE < x else Atom.from_value(0 - x.value)
+
+
+def pow_op(expr: "LList", state: Dict) -> "Atom":
+    x = expr.childs[1].evaluate(state)
+    y = expr.childs[2].evaluate(state)
+    return TRUE if y == FALSE else Atom.from_value(x.value**y.value)
+
+
+def sqrt_op(expr: "LList", state: Dict) -> "Atom":
+    return Atom.from_value(math.sqrt(expr.childs[1].evaluate(state).value))
+
+
+def len_op(expr: "LList", state: Dict) -> "Atom":
+    old_list = expr.childs[1].evaluate(state)
+    if isinstance(old_list, Atom) and old_list.type in (
+        Atom.AtomTypes.LIST,
+        Atom.AtomTypes.STRING,
+    ):
+        return Atom.from_value(len(old_list.value))
+    raise Exception("Cannot len: not a list")
+
+
+def vector_arg(expr: "LList", i: int, state: Dict, name: str) -> Vector:
+    v = expr.childs[i].evaluate(state)
+    if isinstance(v, Atom) and v.type == v.AtomTypes.VECTOR:
+        return v.value
+    raise Exception(f"Cannot {name}: not a vector")
+
+
+def vector_op(expr: "LList", state: Dict) -> "Atom":
+    return Atom.from_value(
+        Vector([Vector.item(c.evaluate(state)) for c in expr.childs[1:]])
+    )
+
+
+def vec_op(expr: "LList", state: Dict) -> "Atom":
+    old_list = expr.childs[1].evaluate(state)
+    if isinstance(old_list, Atom) and old_list.type == old_list.AtomTypes.LIST:
+        return Atom.from_value(Vector([Vector.item(e) for e in old_list.value]))
+    raise Exception("Cannot vec: not a list")
+
+
+def vlist_op(expr: "LList", state: Dict) -> "Atom":
+    v = vector_arg(expr, 1, state, "vlist")
+    return Atom.from_value(Cons.from_iterable(map(Vector.atom, v.items)))
+
+
+def nth_op(expr: "LList", state: Dict) -> "Atom":
+    v = vector_arg(expr, 1, state, "nth")
+    return Vector.atom(v.items[expr.childs[2].evaluate(state).value])
+
+
+def vlen_op(expr: "LList", state: Dict) -> "Atom":
+    return Atom.from_value(len(vector_arg(expr, 1, state, "vlen")))
+
+
+def vset_op(expr: "LList", state: Dict) -> "Atom":
+    v = vector_arg(expr, 1, state, "vset")
+    index = expr.childs[2].evaluate(state).value
+    v.items[index] = Vector.item(expr.childs[3].evaluate(state))
+    return Atom.from_value(v)
+
+
+def vslice_op(expr: "LList", state: Dict) -> "Atom":
+    v = vector_arg(expr, 1, state, "vslice")
+    start = expr.childs[2].evaluate(state).value
+    end = expr.childs[3].evaluate(state).value if len(expr.childs) > 3 else None
+    return Atom.from_value(Vector(v.items[start:end]))
+
+
+def vsum_op(expr: "LList", state: Dict) -> "Atom":
+    return Atom.from_value(sum(vector_arg(expr, 1, state, "vsum").items))
+
+
+def vdot_op(expr: "LList", state: Dict) -> "Atom":
+    x = vector_arg(expr, 1, state, "vdot")
+    y = vector_arg(expr, 2, state, "vdot")
+    if len(x) != len(y):
+        raise Exception("Cannot vdot: vectors of different lengths")
+    return Atom.from_value(sum(map(operator.mul, x.items, y.items)))
+
+
+def elementwise(op: Callable[[Any, Any], Any], name: str):
+    """
+    Builtin applying op to the elements of two vectors of the same length, or
+    of a vector and a number
+    """
+
+    def elementwise_op(expr: "LList", state: Dict) -> "Atom":
+        x = expr.childs[1].evaluate(state)
+        y = expr.childs[2].evaluate(state)
+        if x.type == x.AtomTypes.VECTOR and y.type == y.AtomTypes.VECTOR:
+            if len(x.value) != len(y.value):
+                raise Exception(f"Cannot {name}: vectors of different lengths")
+            items = list(map(op, x.value.items, y.value.items))
+        elif x.type == x.AtomTypes.VECTOR and y.type == y.AtomTypes.NUM:
+            items = list(map(op, x.value.items, repeat(y.value)))
+        elif x.type == x.AtomTypes.NUM and y.type == y.AtomTypes.VECTOR:
+            items = list(map(op, repeat(x.value), y.value.items))
+        else:
+            raise Exception(f"Cannot {name}: not a vector")
+        return Atom.from_value(Vector(items))
+
+    return elementwise_op
+
+
+# Strings
+
+
+def string_arg(expr: "LList", i: int, state: Dict, name: str) -> str:
+    s = expr.childs[i].evaluate(state)
+    if isinstance(s, Atom) and s.type == s.AtomTypes.STRING:
+        return s.value
+    raise Exception(f"Cannot {name}: not a string")
+
+
+def index_arg(expr: "LList", i: int, state: Dict, name: str) -> int:
+    index = expr.childs[i].evaluate(state).value
+    if type(index) is not int:
+        raise Exception(f"Cannot {name}: {index} is not an index")
+    return index
+
+
+def strlen_op(expr: "LList", state: Dict) -> "Atom":
+    return Atom.from_value(len(string_arg(expr, 1, state, "strlen")))
+
+
+def char_at_op(expr: "LList", state: Dict) -> "Atom":
+    s = string_arg(expr, 1, state, "char-at")
+    return Atom.from_value(s[index_arg(expr, 2, state, "char-at")])
+
+
+def string_append_op(expr: "LList", state: Dict) -> "Atom":
+    return Atom.from_string(
+        "".join(
+            string_arg(expr, i, state, "string-append")
+            for i in range(1, len(expr.childs))
+        )
+    )
+
+
+def substring_op(expr: "LList", state: Dict) -> "Atom":
+    s = string_arg(expr, 1, state, "substring")
+    start = index_arg(expr, 2, state, "substring")
+    end = index_arg(expr, 3, state, "substring") if len(expr.childs) > 3 else len(s)
+    return Atom.from_string(s[start:end])
+
+
+def string_eq_op(expr: "LList", state: Dict) -> "Atom":
+    left = string_arg(expr, 1, state, "string=")
+    return TRUE if left == string_arg(expr, 2, state, "string=") else FALSE
+
+
+def string_list_op(expr: "LList", state: Dict) -> "Atom":
+    s = string_arg(expr, 1, state, "string->list")
+    return Atom.from_value(Cons.from_iterable(Atom.from_value(c) for c in s))
+
+
+def list_string_op(expr: "LList", state: Dict) -> "Atom":
+    chars = expr.childs[1].evaluate(state)
+    if chars.type != Atom.AtomTypes.LIST:
+        raise Exception("Cannot list->string: not a list")
+    if any(c.type != Atom.AtomTypes.CHAR for c in chars.value):
+        raise Exception("Cannot list->string: not a list of chars")
+    return Atom.from_string("".join(c.value for c in chars.value))
 
 
 BUILTINS: Dict[str, Callable[[LList, Dict], Atom]] = {
@@ -403,10 +1587,101 @@ BUILTINS: Dict[str, Callable[[LList, Dict], Atom]] = {
     "<": less_op,
     "var": var_op,
     "def": def_op,
+    "defmemo": defmemo_op,
+    "memoize": memoize_op,
+    "memo-clear": memo_clear_op,
+    "memo-stats": memo_stats_op,
     "echo": echo_op,
     "print": print_op,
     "list": list_op,
     "push": push_op,
     "pop": pop_op,
     "el": el_op,
+    "bool": bool_op,
+    "!": bang_op,
+    "and": and_op,
+    "or": or_op,
+    "xor": xor_op,
+    ">": greater_op,
+    "<=": less_eq_op,
+    ">=": greater_eq_op,
+    "min": min_op,
+    "max": max_op,
+    "abs": abs_op,
+    "pow": pow_op,
+    "sqrt": sqrt_op,
+    "len": len_op,
+    "vector": vector_op,
+    "vec": vec_op,
+    "vlist": vlist_op,
+    "nth": nth_op,
+    "vlen": vlen_op,
+    "vset": vset_op,
+    "vslice": vslice_op,
+    "vsum": vsum_op,
+    "vdot": vdot_op,
+    "v+": elementwise(operator.add, "v+"),
+    "v*": elementwise(operator.mul, "v*"),
+    "strlen": strlen_op,
+    "char-at": char_at_op,
+    "string-append": string_append_op,
+    "substring": substring_op,
+    "string=": string_eq_op,
+    "string->list": string_list_op,
+    "list->string": list_string_op,
+    "pmap": pmap_op,
+    "pfor": pfor_op,
+    "set!": set_op,
+    "while": while_op,
+    "dotimes": loop_op("dotimes"),
+    "for": loop_op("for"),
+}
+
+# Builtins of the core language, which programs cannot redefine
+CORE_BUILTINS = {
+    "+",
+    "-",
+    "*",
+    "/",
+    "//",
+    "%",
+    "if",
+    "eq",
+    "<",
+    "var",
+    "def",
+    "echo",
+    "print",
+    "list",
+    "push",
+    "pop",
+    "el",
+}
+
+# Native versions of the other builtins, called only while the program does
+# not bind their name, so that it can define its own
+NATIVES = frozenset(BUILTINS.keys() - CORE_BUILTINS)
+
+# Builtins that pass on the tail position to some of their arguments
+TAIL_BUILTINS: Dict[str, Callable[[LList, Dict], Union[Atom, TailCall]]] = {
+    "if": if_tail_op,
+}
+
+# Builtins that receive their arguments as syntax and not as values
+SPECIAL_FORMS = {
+    "var",
+    "def",
+    "if",
+    "and",
+    "or",
+    "defmemo",
+    "memoize",
+    "memo-clear",
+    "memo-stats",
+    "pmap",
+    "pfor",
+    "set!",
+    "while",
+    "dotimes",
+    "for",
 }
@@ -2,62 +2,344 @@
 # coding: utf-8
 
 import argparse
+import glob
 import os
+import pickle
 import sys
-from typing import Dict
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Union
 
-from llisp.parser import listing
+from llisp import closures, parallel, profiler, vm
+from llisp.lbuiltins import NATIVES, Atom, LList, Name, ParseError, State
+from llisp.optimizer import Optimizer
+from llisp.parser import read, tokenize
 
 sys.setrecursionlimit(100_000)
 
+STD_PATH = os.path.join(os.path.dirname(__file__), "std.lisp")
 
-def execute_file(filename: str, state: Dict, debug=False) -> int:
+
+def tree_evaluate(e: Union[Atom, LList], state: Dict) -> Atom:
+    return e.evaluate(state)
+
+
+# Evaluation engines, each runs a top level form in a state
+ENGINES: Dict[str, Callable[[Union[Atom, LList], Dict], Atom]] = {
+    "tree": tree_evaluate,
+    "closure": closures.evaluate,
+    "vm": vm.evaluate,
+}
+
+
+def execute_file(
+    filename: str,
+    state: Dict,
+    debug=False,
+    engine="tree",
+    optimizer: Optional[Optimizer] = None,
+) -> int:
+    """
+    Run a script one top level form at a time: each form is read from the
+    file, optimized if an optimizer is given, evaluated and released before
+    the next one is read
+    """
+    evaluate = ENGINES[engine]
     with open(filename, "r") as script_file:
-        script = script_file.read()
-        e = listing(script, None)
-        if debug:
-            print(f"EXPR::{e}")
-        e.evaluate(state)
+        for e in read(tokenize(script_file)):
+            if optimizer is not None:
+                e = optimizer.optimize(e)
+            if debug:
+                print(f"EXPR::{e}")
+            evaluate(e, state)
         return 0
 
 
+def snapshot_path() -> str:
+    """
+    Path of the snapshot of the loaded std, keyed by the content of std.lisp
+    and of the modules reading it and defining the pickled objects
+    """
+    digest = 0
+    for name in ("std.lisp", "lbuiltins.py", "parser.py"):
+        with open(os.path.join(os.path.dirname(__file__), name), "rb") as source:
+            digest = zlib.crc32(source.read(), digest)
+    cache_dir = os.environ.get(
+        "LLISP_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "llisp")
+    )
+    return os.path.join(cache_dir, f"std-{digest:08x}.pickle")
+
+
+def save_snapshot(std: Dict, path: str) -> None:
+    """Save the snapshot, removing those of other versions of the sources"""
+    tmp_path = f"{path}.{os.getpid()}"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "wb") as snapshot_file:
+            pickle.dump(std, snapshot_file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        for stale in glob.glob(os.path.join(os.path.dirname(path), "std-*.pickle")):
+            if stale != path:
+                os.remove(stale)
+    except OSError:
+        pass
+
+
 def load_std(state: Dict[str, str]) -> None:
-    STD_PATH = os.path.join(os.path.dirname(__file__), "std.lisp")
-    execute_file(STD_PATH, state)
+    """
+    Load the standard library in the state. The loaded std is saved in a
+    snapshot on disk, which later starts restore instead of running
+    std.lisp again.
+    """
+    path = snapshot_path()
+    try:
+        with open(path, "rb") as snapshot_file:
+            std = pickle.load(snapshot_file)
+    except Exception:
+        std = {}
+        execute_file(STD_PATH, std)
+        # std.lisp keeps the definitions of the natives as their reference,
+        # the natives are called instead while their names are unbound
+        for name in NATIVES:
+            std.pop(name, None)
+        save_snapshot(std, path)
+
+    # std procedures see the globals of the state they are loaded in
+    for value in std.values():
+        if isinstance(value, Name) and value.env is std:
+            value.env = state
+    state.update(std)
 
 
-def arguments():
-    parser = argparse.ArgumentParser()
+def std_base() -> State:
+    """Frozen state holding the std, to fork the states of programs from"""
+    state = State()
+    load_std(state)
+    return state.freeze()
+
+
+# Subcommands of llisplang, the arguments not starting with one are run
+COMMANDS = ("run", "run-many", "serve")
+
+
+def arguments(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    # Imported here as the batch runner and the server depend on this module
+    from llisp import batch, server
+
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] not in COMMANDS + ("-h", "--help"):
+        argv = ["run", *argv]
+
+    top = argparse.ArgumentParser(prog="llisplang")
+    commands = top.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+    parser = commands.add_parser(
+        "run",
+        help="run a file, or the repl without one (the default command)",
+    )
+    batch.add_arguments(
+        commands.add_parser("run-many", help="run a batch of scripts in one start")
+    )
+    server.add_arguments(
+        commands.add_parser("serve", help="answer evaluation requests on a socket")
+    )
     parser.add_argument("file", nargs="?", default="")
-    return parser.parse_args()
+    parser.add_argument(
+        "--engine", choices=ENGINES, default="tree", help="evaluation engine"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="processes running pmap and pfor",
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="print the tree of each form before evaluating it",
+    )
+    parser.add_argument(
+        "--no-optimize",
+        action="store_true",
+        help="evaluate the forms without folding their constants",
+    )
+    parser.add_argument(
+        "--dump-ast",
+        action="store_true",
+        help="write each optimized form to stderr before evaluating it",
+    )
+    parser.add_argument(
+        "--bench", action="store_true", help="run the benchmarks on the engine"
+    )
+    parser.add_argument(
+        "--bench-repeat", type=int, default=5, help="samples of each benchmark"
+    )
+    parser.add_argument(
+        "--bench-filter", default="", help="only run benchmarks containing this"
+    )
+    parser.add_argument("--bench-json", default="", help="write the results here")
+    parser.add_argument(
+        "--bench-compare", default="", help="compare to the results of this file"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="report the time spent in each procedure and builtin",
+    )
+    parser.add_argument(
+        "--profile-stacks",
+        default="",
+        help="write the profiled collapsed stacks here, for flame graphs",
+    )
+    args = top.parse_args(argv)
+    if args.workers < 1:
+        commands.choices[args.command].error("--workers must be at least 1")
+    if args.command != "run":
+        return args
+    if (args.profile or args.profile_stacks) and args.engine not in profiler.ENGINES:
+        parser.error(f"--profile is not supported by the {args.engine} engine")
+    if args.dump_ast and args.no_optimize:
+        parser.error("--dump-ast writes the optimized forms")
+    return args
+
+
+def is_complete(source: str) -> bool:
+    """Whether the source closes all its parentheses, strings and chars"""
+    depth = 0
+    try:
+        for token in tokenize([source]):
+            if token == "(":
+                depth += 1
+            elif token == ")":
+                depth -= 1
+    except ParseError:
+        return False
+    return depth <= 0
 
 
-def repl(state: Dict[str, str]) -> int:
+class FormCache(object):
+    """
+    Forms read from the last source texts, so that a source entered again is
+    not read nor optimized again. The least recently used are evicted past
+    maxsize.
+    """
+
+    DEFAULT_MAXSIZE = 256
+
+    def __init__(
+        self, optimizer: Optional[Optimizer] = None, maxsize: int = DEFAULT_MAXSIZE
+    ):
+        self.optimizer = optimizer
+        self.maxsize = maxsize
+        self.forms: "OrderedDict[str, List[Union[Atom, LList]]]" = OrderedDict()
+
+    def read(self, source: str) -> List[Union[Atom, LList]]:
+        """Top level forms of the source, evaluated one by one"""
+        forms = self.forms.get(source)
+        if forms is not None:
+            self.forms.move_to_end(source)
+            return forms
+
+        forms = list(read(tokenize([source])))
+        if self.optimizer is not None:
+            forms = [self.optimizer.optimize(form) for form in forms]
+        self.forms[source] = forms
+        if len(self.forms) > self.maxsize:
+            self.forms.popitem(last=False)
+        return forms
+
+
+def repl(
+    state: Dict[str, str],
+    engine="tree",
+    optimizer: Optional[Optimizer] = None,
+    debug=False,
+) -> int:
+    """
+    Read forms until the end of the input. A form spans several lines until
+    its parentheses are balanced.
+    """
     print("Welcome to Loïc Lisp interpreter (llisp)")
     print("Type exit to exit")
+    forms = FormCache(optimizer)
+    lines: List[str] = []
     while True:
-        user_in = input(">>> ")
-        if user_in == "exit":
+        try:
+            user_in = input("... " if lines else ">>> ")
+        except EOFError:
+            return 0
+        if user_in == "exit" and not lines:
             return 0
-        else:
-            e = listing(user_in, None)
-            print(f"EXPR::{e}")
-            evaluation = e.evaluate(state)
-            if evaluation is not None:
-                print(f"<<< {evaluation.value}")
+        lines.append(user_in)
+        source = "\n".join(lines)
+        if not is_complete(source):
+            continue
+        lines = []
+        if not source.strip():
+            continue
+
+        evaluation: Optional[Atom] = None
+        for e in forms.read(source):
+            if debug:
+                print(f"EXPR::{e}")
+            evaluation = ENGINES[engine](e, state)
+        if evaluation is not None:
+            print(f"<<< {evaluation.value}")
 
 
 def main() -> int:
+    args = arguments()
+    if args.command == "run-many":
+        from llisp import batch
+
+        return batch.run(args)
+    if args.command == "serve":
+        from llisp import server
+
+        return server.run(args)
+
+    if args.bench:
+        # Imported here as the benchmarks depend on this module
+        from llisp import bench
+
+        return bench.main(
+            args.engine,
+            args.bench_repeat,
+            args.bench_filter,
+            args.bench_json,
+            args.bench_compare,
+        )
+
+    if args.profile or args.profile_stacks:
+        with profiler.Profiler() as profile:
+            status = run(args)
+        print("\n".join(profile.table()), file=sys.stderr)
+        if args.profile_stacks:
+            with open(args.profile_stacks, "w") as stacks_file:
+                profile.write_stacks(stacks_file)
+        return status
+
+    return run(args)
+
+
+def run(args: argparse.Namespace) -> int:
     state: Dict[str, str] = {}
 
     load_std(state)
+    parallel.configure(args.workers, args.engine)
+
+    optimizer = None
+    if not args.no_optimize:
+        optimizer = Optimizer(sys.stderr if args.dump_ast else None)
 
-    args = arguments()
     if args.file:
-        return execute_file(args.file, state)
+        return execute_file(
+            args.file, state, args.debug, engine=args.engine, optimizer=optimizer
+        )
     else:
-        return repl(state)
+        return repl(state, args.engine, optimizer, args.debug)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
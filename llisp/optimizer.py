@@ -0,0 +1,128 @@
+"""
+Optimization pass run on each top level form before it is evaluated
+
+Calls of pure builtins whose arguments are all constants are replaced by
+their result, and an if whose condition is a constant by the branch taken.
+Folding goes bottom up, so constant subexpressions of procedure bodies are
+computed once when the procedure is defined instead of at every call.
+
+Only builtins of the core language are folded: the natives can be redefined
+by the program, even after the forms calling them are read.
+"""
+
+from typing import Iterable, Optional, TextIO, Union
+
+from llisp.lbuiltins import SYNTAX_CHILDS, Atom, LList, Name, Vector
+
+# Builtins of the core language without side effects, whose result only
+# depends on their arguments
+PURE_BUILTINS = {
+    "+",
+    "-",
+    "*",
+    "/",
+    "//",
+    "%",
+    "<",
+    "eq",
+    "list",
+    "push",
+    "pop",
+    "el",
+}
+
+# Types of the atoms that are constants. Vectors are not as they are mutable.
+CONSTANT_TYPES = (
+    Atom.AtomTypes.NUM,
+    Atom.AtomTypes.CHAR,
+    Atom.AtomTypes.STRING,
+    Atom.AtomTypes.LIST,
+)
+
+
+def is_constant(node: Union[Atom, LList]) -> bool:
+    return type(node) is Atom and node.type in CONSTANT_TYPES
+
+
+def action_name(node: LList) -> Optional[str]:
+    head = node.childs[0] if node.childs else None
+    if isinstance(head, Atom) and head.type == Atom.AtomTypes.NAME:
+        return head.value_str
+    return None
+
+
+def first_operand(name: Optional[str]) -> int:
+    """Index of the first child of a form that is evaluated"""
+    if name in SYNTAX_CHILDS:
+        count = SYNTAX_CHILDS[name]
+        return 2 if count is None else count
+    return 1
+
+
+def dump(node: Union[Atom, LList]) -> str:
+    """Source notation of an expression"""
+    if isinstance(node, LList):
+        return f"({' '.join(dump(child) for child in node.childs)})"
+    if node.type == Atom.AtomTypes.STRING:
+        return '"' + node.value.encode("unicode_escape").decode("latin-1") + '"'
+    if node.type == Atom.AtomTypes.CHAR:
+        return "'" + node.value.encode("unicode_escape").decode("latin-1") + "'"
+    if node.type == Atom.AtomTypes.LIST:
+        return dump_call("list", node.value)
+    if node.type == Atom.AtomTypes.VECTOR:
+        return dump_call("vector", map(Vector.atom, node.value.items))
+    return node.value_str
+
+
+def dump_call(name: str, args: Iterable[Atom]) -> str:
+    return f"({' '.join([name, *(dump(arg) for arg in args)])})"
+
+
+class Optimizer(object):
+    def __init__(self, output: Optional[TextIO] = None):
+        # Where to write the optimized forms, if anywhere
+        self.output = output
+
+    def optimize(self, node: Union[Atom, LList]) -> Union[Atom, LList]:
+        node = self.fold(node)
+        if self.output is not None:
+            self.output.write(f"{dump(node)}\n")
+        return node
+
+    def fold(self, node: Union[Atom, LList]) -> Union[Atom, LList]:
+        if not isinstance(node, LList) or not node.childs:
+            return node
+        name = action_name(node)
+        head = node.childs[0]
+        if isinstance(head, LList):
+            # Head of a sequence, an atom in its place would be called
+            folded = self.fold(head)
+            node.childs[0] = folded if isinstance(folded, LList) else head
+            start = 1
+        else:
+            start = first_operand(name)
+        node.childs[start:] = [self.fold(child) for child in node.childs[start:]]
+
+        if name == "if":
+            return self.fold_if(node)
+        if (
+            name in PURE_BUILTINS
+            and type(node.childs[0]) is Name
+            and all(is_constant(child) for child in node.childs[1:])
+        ):
+            try:
+                return node.evaluate({})
+            except Exception:
+                # Left for the evaluation to raise, if it ever runs
+                return node
+        return node
+
+    def fold_if(self, node: LList) -> Union[Atom, LList]:
+        condition = node.childs[1] if len(node.childs) > 2 else None
+        if not isinstance(condition, Atom) or not is_constant(condition):
+            return node
+        if condition.value != 0:
+            return node.childs[2]
+        if len(node.childs) > 3:
+            return node.childs[3]
+        return node
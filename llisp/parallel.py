@@ -0,0 +1,207 @@
+"""
+Parallel map of a procedure over a process pool
+
+The workers of the pool load the std once when they start. A map sends each
+worker a chunk of the arguments together with the definitions of the
+procedure and of the globals it refers to, so the workers never see the
+state of the caller. The procedure must be pure: its side effects on the
+globals stay in the worker running it.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from llisp.lbuiltins import (
+    BUILTINS,
+    CORE_BUILTINS,
+    VALUE_TYPES,
+    Atom,
+    Cons,
+    Frame,
+    LList,
+    Name,
+    NotCallable,
+    ParseError,
+    State,
+    UndefinedError,
+    create_atom,
+    def_op,
+)
+
+# Chunks of arguments sent to each worker by a map, more than one balances
+# the load when the calls do not take the same time
+CHUNKS_PER_WORKER = 4
+
+WORKERS = os.cpu_count() or 1
+ENGINE = "tree"
+
+# Globals of the procedure: the values of the variables, and the definitions
+# of the procedures
+Globals = Tuple[Dict[str, Atom], List[LList]]
+
+_pool: Optional[ProcessPoolExecutor] = None
+# State of a worker, holding the std
+_worker_state: Optional[State] = None
+
+
+def configure(workers: Optional[int] = None, engine: Optional[str] = None) -> None:
+    """Set the number of workers and the engine they evaluate with"""
+    global WORKERS, ENGINE
+    if workers is not None:
+        if workers < 1:
+            raise ValueError(f"at least one worker is needed, got {workers}")
+        if workers != WORKERS:
+            shutdown()
+        WORKERS = workers
+    if engine is not None:
+        ENGINE = engine
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
+
+
+def pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(WORKERS, initializer=init_worker)
+    return _pool
+
+
+def init_worker() -> None:
+    global _worker_state
+    # Imported here as the main module depends on this one
+    from llisp.main import std_base
+
+    _worker_state = std_base()
+
+
+def references(node: Union[Atom, LList]) -> Iterable[str]:
+    """Names appearing in an expression"""
+    if isinstance(node, LList):
+        for child in node.childs:
+            yield from references(child)
+    elif isinstance(node, Name):
+        yield node.value_str
+
+
+def procedure(name: Union[Atom, LList], state: Dict, builtin: str) -> Name:
+    """Procedure mapped by the builtin, defined at the top level"""
+    if not isinstance(name, Atom) or name.type != Atom.AtomTypes.NAME:
+        raise ParseError(f"Parse error: expected a procedure name, got {name}")
+    if name.value_str in BUILTINS and name.value_str not in state:
+        raise NotCallable(f"{builtin} expects a user-defined procedure")
+    if name.value_str not in state:
+        raise UndefinedError(f"{name.value_str} Undefined")
+    proc = state[name.value_str]
+    if proc.type != Atom.AtomTypes.NAME or proc.params is None:
+        raise NotCallable(f"{name.value_str} not a procedure")
+    if isinstance(proc.env, Frame):
+        raise NotCallable(f"{name.value_str} is not defined at the top level")
+    return proc
+
+
+def collect_globals(proc: Name) -> Globals:
+    """Variables and procedures of the globals the procedure depends on"""
+    env: Dict = proc.env if proc.env is not None else {}
+    values: Dict[str, Atom] = {}
+    definitions: List[LList] = []
+    seen = {proc.name}
+    pending = [proc]
+    while pending:
+        current = pending.pop()
+        definitions.append(current.value)
+        for name in references(current.value):
+            if name in seen or name in CORE_BUILTINS or name not in env:
+                continue
+            seen.add(name)
+            value = env[name]
+            if value.type == Atom.AtomTypes.NAME and value.params is not None:
+                if value.env is env:
+                    pending.append(value)
+            elif value.type in VALUE_TYPES:
+                values[name] = value
+    return values, definitions
+
+
+def apply_all(name: str, args: Iterable[Atom], state: Dict, engine: str) -> List[Atom]:
+    from llisp.main import ENGINES
+
+    evaluate = ENGINES[engine]
+    head = create_atom(name)
+    results = []
+    for arg in args:
+        call = LList()
+        call.childs = [head, arg]
+        results.append(evaluate(call, state))
+    return results
+
+
+def run_chunk(
+    engine: str, name: str, globals_: Globals, args: Union[List[Atom], range]
+) -> List[Atom]:
+    """Apply the procedure to a chunk of arguments, in a worker"""
+    values, definitions = globals_
+    assert _worker_state is not None
+    state = _worker_state.fork(values)
+    for definition in definitions:
+        def_op(definition, state)
+    if isinstance(args, range):
+        args = [Atom.from_value(i) for i in args]
+    return apply_all(name, args, state, engine)
+
+
+def chunks(count: int) -> Iterable[range]:
+    """Split count items in ranges for the workers"""
+    parts = min(count, WORKERS * CHUNKS_PER_WORKER)
+    for i in range(parts):
+        yield range(count * i // parts, count * (i + 1) // parts)
+
+
+def parallel_map(proc: Name, args: Union[List[Atom], range], state: Dict) -> List[Atom]:
+    """Results of the procedure on each argument, in order"""
+    if WORKERS == 1 or len(args) < 2:
+        if isinstance(args, range):
+            args = [Atom.from_value(i) for i in args]
+        return apply_all(proc.name, args, state, ENGINE)
+
+    globals_ = collect_globals(proc)
+    results: List[Atom] = []
+    tasks = [args[part.start : part.stop] for part in chunks(len(args))]
+    for chunk in pool().map(
+        run_chunk,
+        [ENGINE] * len(tasks),
+        [proc.name] * len(tasks),
+        [globals_] * len(tasks),
+        tasks,
+    ):
+        results.extend(chunk)
+    return results
+
+
+def pmap(expr: LList, state: Dict) -> Atom:
+    """(pmap f list): list of (f x) for each element x of the list"""
+    if len(expr.childs) != 3:
+        raise ParseError("Parse error: usage (pmap f list)")
+    proc = procedure(expr.childs[1], state, "pmap")
+    elements = expr.childs[2].evaluate(state)
+    if elements.type != Atom.AtomTypes.LIST:
+        raise Exception("Cannot pmap: not a list")
+    results = parallel_map(proc, list(elements.value), state)
+    return Atom.from_value(Cons.from_iterable(results))
+
+
+def pfor(expr: LList, state: Dict) -> Atom:
+    """(pfor f start end): list of (f i) for each integer i in [start, end["""
+    if len(expr.childs) != 4:
+        raise ParseError("Parse error: usage (pfor f start end)")
+    proc = procedure(expr.childs[1], state, "pfor")
+    start, end = (child.evaluate(state) for child in expr.childs[2:])
+    if start.type != Atom.AtomTypes.NUM or end.type != Atom.AtomTypes.NUM:
+        raise Exception("Cannot pfor: not a number")
+    results = parallel_map(proc, range(int(start.value), int(end.value)), state)
+    return Atom.from_value(Cons.from_iterable(results))
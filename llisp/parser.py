@@ -1,89 +1,138 @@
-from typing import List, Tuple, Union
-
-from llisp.lbuiltins import Atom, LList, Program, create_atom
-
-
-def lexer(expr: str) -> Tuple[List[str], int]:
-    sub_expr: List[str] = [""]
-    i = 0
-    depth = 0
-    max_depth = 0
-    expr = expr.strip()
-    in_string = False
-    for e in expr:
-        if in_string:
-            sub_expr[-1] += e
-            if e in "'\"":
-                in_string = False
-            continue
-        elif e == "(":
-            depth += 1
-            max_depth += 1
-            if depth <= 1:
+import re
+from typing import Iterable, Iterator, List, Union
+
+from llisp.lbuiltins import Atom, LList, ParseError, Program, create_atom
+
+# A token is a parenthesis, a quoted char or string, or a bare word. Leading
+# whitespace is consumed with the token so the reader never rescans it.
+TOKEN_RE = re.compile(
+    r"""\s*([()]|'(?:\\.|[^\\'])*'|"(?:\\.|[^\\"])*"|[^\s()'"]+)""", re.DOTALL
+)
+# Body of a string after its opening quote, up to its closing quote
+STRING_BODY = {
+    quote: re.compile(rf"(?:\\.|[^\\{quote}])*", re.DOTALL) for quote in "'\""
+}
+
+
+def string_body_end(text: str, pos: int, quote: str) -> int:
+    """
+    End of the body of a string from pos: its closing quote, the end of the
+    text, or a backslash ending the text
+    """
+    body = STRING_BODY[quote].match(text, pos)
+    return pos if body is None else body.end()
+
+
+def tokenize(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Split a source into tokens in a single pass
+
+    The source can be given in several chunks (e.g. the lines of a file), a
+    token that may continue in the next chunk is held back until it is
+    complete. A string left open is held from its opening quote, and only the
+    next chunks are scanned for its closing quote.
+    """
+    rest = ""
+    held: List[str] = []
+    escaped = False
+    for chunk in chunks:
+        if held:
+            if not chunk:
                 continue
-        elif e == ")":
-            depth -= 1
-            if depth <= 0:
+            quote = held[0][0]
+            body_end = string_body_end(chunk, 1 if escaped else 0, quote)
+            if body_end == len(chunk) or chunk[body_end] != quote:
+                # Still open, escaped when the chunk ends on a backslash
+                held.append(chunk)
+                escaped = body_end < len(chunk)
                 continue
-        elif e in "'\"":
-            in_string = True
-        if (
-            depth <= 0
-            and e.isspace()
-            and len(sub_expr) == i + 1
-            and len(sub_expr[i]) > 0
-        ):
-            i += 1
-            continue
-        if len(sub_expr) <= i and not e.isspace():
-            sub_expr.append(e)
+            text = "".join(held) + chunk
+            held = []
         else:
-            sub_expr[-1] += e
+            text = rest + chunk
+        pos = 0
+        end = len(text)
+        while True:
+            match = TOKEN_RE.match(text, pos)
+            if match is None:
+                break
+            token = match.group(1)
+            if match.end() == end and token not in "()":
+                break
+            yield token
+            pos = match.end()
+        rest = text[pos:]
+        tail = rest.lstrip()
+        if match is None and tail[:1] in ("'", '"'):
+            # A string left open, scanned up to the end of the chunk
+            held = [tail]
+            escaped = string_body_end(tail, 1, tail[0]) < len(tail)
+            rest = ""
+    if held:
+        rest = "".join(held)
 
-    return sub_expr, max_depth
+    pos = 0
+    last = TOKEN_RE.match(rest)
+    while last is not None:
+        yield last.group(1)
+        pos = last.end()
+        last = TOKEN_RE.match(rest, pos)
+    if rest[pos:].strip():
+        raise ParseError(f"Parse ERROR: unterminated {rest[pos:].strip()}")
 
 
-def expand_str(expr: List[str], max_depth) -> Union[List[str], Atom]:
-    """Create a list of char from the string notation or return an atom object"""
-    if len(expr) == 1 and max_depth == 0:
-        current_expr = expr[0].strip()
-        if current_expr[0] == current_expr[-1] == '"':
-            new_expr = "(list"
-            for c in current_expr[1:-1]:
-                c = f" '{c}'"
-                new_expr += c
-            new_expr += ")"
-            expr[0] = new_expr
+def unescape(s: str) -> str:
+    return s.encode("latin-1", "backslashreplace").decode("unicode_escape")
+
+
+def create_str(token: str) -> Atom:
+    """Create a string atom from the string notation"""
+    return Atom.from_string(unescape(token[1:-1]))
 
-        else:
-            return create_atom(expr[0].strip())
 
-    return expr
+def read_token(token: str) -> Union[Atom, LList]:
+    if token[0] == '"':
+        return create_str(token)
+    return create_atom(token)
 
 
-def atomize(expr: List["str"]):
-    """Instanciate Atoms and sub LList from the tokens"""
-    current_list = LList()
-    # print(expr)
-    for e in expr:
-        current_list.childs.append(listing(f"{e}", current_list))
-    return current_list
+def read(tokens: Iterable[str]) -> Iterator[Union[Atom, LList]]:
+    """
+    Build the AST of each top level form from the tokens, yielding every form
+    as soon as it is complete. Nesting is tracked with an explicit stack. A
+    parenthesis closing no list, or a list left open at the end of the source,
+    is a ParseError.
+    """
+    stack: List[LList] = []
+    for token in tokens:
+        if token == "(":
+            stack.append(LList())
+            continue
+        if token == ")":
+            if not stack:
+                raise ParseError("Parse ERROR: unexpected )")
+            node: Union[Atom, LList] = stack.pop()
+        else:
+            node = read_token(token)
+        if stack:
+            stack[-1].childs.append(node)
+        else:
+            yield node
+    if stack:
+        raise ParseError(f"Parse ERROR: {len(stack)} unclosed (")
 
 
 def listing(expr: str, parent: Union[None, LList] = None) -> Union[Atom, LList]:
     """From an expression returns an AST tree that can be evaluated"""
-    tokens, max_depth = lexer(expr)
-    expanded_tokens = expand_str(tokens, max_depth)
-    if isinstance(expanded_tokens, Atom):
-        return expanded_tokens
-    return atomize(tokens)
+    forms = list(read(tokenize([expr])))
+    if len(forms) == 1 and isinstance(forms[0], Atom):
+        return forms[0]
+    llist = LList()
+    llist.childs = forms
+    return llist
 
 
 def create_program(expr: str) -> Program:
     prog = Program()
-    llist = listing(expr)
-    if isinstance(llist, LList):
-        prog.childs = llist.childs
-    else:
-        prog.childs = [llist]
+    prog.childs = list(read(tokenize([expr])))
     return prog
@@ -0,0 +1,141 @@
+"""
+Profiler of Lisp procedures and builtins
+
+While a Profiler is installed, the builtins and the procedure bodies run by
+the tree and closure engines are replaced by timed wrappers. Nothing is
+wrapped otherwise, so profiling costs nothing when it is off.
+
+A procedure body that ends with a tail call returns before its callee runs,
+the callee is then accounted as called by the caller of the body. The
+builtins that the closure engine compiles inline (arithmetic, comparisons,
+if, var, and, or) are accounted in the time of their caller.
+"""
+
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, TextIO, Tuple
+
+from llisp import closures
+from llisp.lbuiltins import BUILTINS, TAIL_BUILTINS, LList, Name, invalidate_caches
+
+# Engines whose procedure calls can be profiled
+ENGINES = ("tree", "closure")
+
+
+class Stats(object):
+    __slots__ = ("calls", "self_time", "cumulative")
+
+    def __init__(self):
+        self.calls = 0
+        self.self_time = 0.0
+        self.cumulative = 0.0
+
+
+class Profiler(object):
+    def __init__(self):
+        self.stats: Dict[str, Stats] = {}
+        # Self time spent under each stack of names
+        self.stacks: Dict[Tuple[str, ...], float] = {}
+        self.stack: List[str] = []
+        # Time spent in the callees of each frame of the stack
+        self.children: List[float] = []
+        # Frames of each name in the stack, to not count recursion twice
+        self.active: Counter = Counter()
+        self.patched: List[Tuple[Any, str, Any]] = []
+        # Procedure definitions holding profiled closures
+        self.compiled: List[LList] = []
+
+    def call(self, name: str, function: Callable, *args: Any) -> Any:
+        self.stack.append(name)
+        self.children.append(0.0)
+        self.active[name] += 1
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self_time = elapsed - self.children.pop()
+            stack = tuple(self.stack)
+            self.stacks[stack] = self.stacks.get(stack, 0.0) + self_time
+            self.stack.pop()
+            self.active[name] -= 1
+
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = Stats()
+            stats.calls += 1
+            stats.self_time += self_time
+            if not self.active[name]:
+                stats.cumulative += elapsed
+            if self.children:
+                self.children[-1] += elapsed
+
+    def wrap(self, name: str, function: Callable) -> Callable:
+        def profiled(*args: Any) -> Any:
+            return self.call(name, function, *args)
+
+        return profiled
+
+    def patch(self, owner: Any, key: str, value: Any) -> None:
+        """Replace an attribute or an item of owner until uninstall"""
+        if isinstance(owner, dict):
+            self.patched.append((owner, key, owner[key]))
+            owner[key] = value
+        else:
+            self.patched.append((owner, key, getattr(owner, key)))
+            setattr(owner, key, value)
+
+    def install(self) -> None:
+        for table in (BUILTINS, TAIL_BUILTINS):
+            for name, op in list(table.items()):
+                self.patch(table, name, self.wrap(name, op))
+
+        run_body = Name.run_body
+        compile_proc = closures.compile_proc
+
+        def profiled_run_body(proc: Name, frame: Dict) -> Any:
+            return self.call(proc.name, run_body, proc, frame)
+
+        def profiled_compile_proc(proc: LList) -> Callable:
+            self.compiled.append(proc)
+            head = proc.childs[1]
+            name = closures.action_name(head) if isinstance(head, LList) else ""
+            return self.wrap(name, compile_proc(proc))
+
+        self.patch(Name, "run_body", profiled_run_body)
+        self.patch(closures, "compile_proc", profiled_compile_proc)
+        # The call sites hold the builtins they call
+        invalidate_caches()
+
+    def uninstall(self) -> None:
+        while self.patched:
+            owner, key, value = self.patched.pop()
+            if isinstance(owner, dict):
+                owner[key] = value
+            else:
+                setattr(owner, key, value)
+        while self.compiled:
+            self.compiled.pop().closure = None
+        invalidate_caches()
+
+    def __enter__(self) -> "Profiler":
+        self.install()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.uninstall()
+
+    def table(self) -> Iterator[str]:
+        """Lines of the report, sorted by decreasing self time"""
+        yield f"{'calls':>10} {'self (s)':>10} {'cumul (s)':>10}  name"
+        ranked = sorted(self.stats.items(), key=lambda s: s[1].self_time, reverse=True)
+        for name, stats in ranked:
+            yield (
+                f"{stats.calls:>10} {stats.self_time:>10.4f} "
+                f"{stats.cumulative:>10.4f}  {name}"
+            )
+
+    def write_stacks(self, output: TextIO) -> None:
+        """Write the collapsed stacks, with their self time in microseconds"""
+        for stack, self_time in self.stacks.items():
+            output.write(f"{';'.join(stack)} {round(self_time * 1e6)}\n")
@@ -0,0 +1,178 @@
+"""
+Evaluation server speaking JSON lines over a local socket
+
+Each line sent by a client is a request {"id": ..., "source": "..."}, answered
+by a line {"id": ..., "value": "...", "output": "...", "error": ...} once the
+forms of the source are evaluated. Every connection is a session with its own
+state, cloned from the std loaded once when the server starts.
+
+The evaluations run in a pool of threads so that a long one does not block
+the event loop, the other sessions are still served meanwhile. The threads
+share the GIL: the sessions are served concurrently but the evaluations do
+not run in parallel, the throughput stays the one of a single core whatever
+the number of workers. A process pool would not fit, the session states live
+in the server and are not picklable cheaply on every request.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, TextIO
+
+from llisp.batch import fresh_state
+from llisp.main import ENGINES, load_std
+from llisp.optimizer import Optimizer
+from llisp.parser import read, tokenize
+
+# Stack of the evaluation threads, deep recursions need more than the default
+THREAD_STACK_SIZE = 256 * 1024 * 1024
+
+
+class SessionOutput(object):
+    """
+    Replacement of sys.stdout writing the output of each evaluation thread in
+    the buffer of its evaluation
+    """
+
+    def __init__(self, default: TextIO):
+        self.default = default
+        self.local = threading.local()
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer if buffer is not None else self.default).write(text)
+
+    def flush(self) -> None:
+        if getattr(self.local, "buffer", None) is None:
+            self.default.flush()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.default, name)
+
+
+class Session(object):
+    def __init__(self, std: Dict, engine: str, output: SessionOutput):
+        self.state = fresh_state(std)
+        self.optimizer = Optimizer()
+        self.engine = engine
+        self.output = output
+
+    def evaluate(self, source: str) -> Dict[str, Any]:
+        """Evaluate the forms of the source, in an evaluation thread"""
+        evaluate = ENGINES[self.engine]
+        buffer = io.StringIO()
+        response: Dict[str, Any] = {"value": None, "output": "", "error": None}
+        self.output.local.buffer = buffer
+        try:
+            for form in read(tokenize([source])):
+                result = evaluate(self.optimizer.optimize(form), self.state)
+                response["value"] = None if result is None else str(result.value)
+        except Exception as error:
+            response["error"] = f"{type(error).__name__}: {error}"
+        finally:
+            self.output.local.buffer = None
+        response["output"] = buffer.getvalue()
+        return response
+
+
+class Server(object):
+    def __init__(self, engine: str = "tree", workers: int = 4):
+        self.std: Dict = {}
+        load_std(self.std)
+        self.engine = engine
+        self.output = SessionOutput(sys.stdout)
+        self.pool = ThreadPoolExecutor(workers)
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        session = Session(self.std, self.engine, self.output)
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request_id = None
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    source = request["source"]
+                    if not isinstance(source, str):
+                        raise TypeError("source is not a string")
+                except (ValueError, KeyError, TypeError, AttributeError) as error:
+                    response: Dict[str, Any] = {
+                        "value": None,
+                        "output": "",
+                        "error": f"Invalid request: {error}",
+                    }
+                else:
+                    response = await loop.run_in_executor(
+                        self.pool, session.evaluate, source
+                    )
+                response["id"] = request_id
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(
+        self, path: Optional[str] = None, port: Optional[int] = None
+    ) -> asyncio.Server:
+        """Listen on the Unix socket path, or else on the TCP port of localhost"""
+        if path is not None:
+            return await asyncio.start_unix_server(self.handle, path)
+        return await asyncio.start_server(self.handle, "127.0.0.1", port)
+
+    async def serve(self, path: Optional[str] = None, port: Optional[int] = None):
+        server = await self.start(path, port)
+        addresses = [str(s.getsockname()) for s in server.sockets]
+        print(f"llisp serving on {', '.join(addresses)}", file=sys.stderr)
+        stdout = sys.stdout
+        sys.stdout = self.output  # type: ignore
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sys.stdout = stdout
+            self.pool.shutdown(wait=False)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--socket", help="path of the Unix socket to listen on")
+    address.add_argument("--port", type=int, help="TCP port to listen on localhost")
+    parser.add_argument(
+        "--engine", choices=ENGINES, default="tree", help="evaluation engine"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="threads running the evaluations, concurrently but not in parallel",
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="llisplang serve")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return run(args)
+
+
+def run(args: argparse.Namespace) -> int:
+    # Process-wide, set once here for the evaluation threads started next
+    threading.stack_size(THREAD_STACK_SIZE)
+    server = Server(args.engine, args.workers)
+    try:
+        asyncio.run(server.serve(args.socket, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -23,7 +23,7 @@
      (if (< 0 x) x (- 0 x)))
 
 (def (> x y)
-     (! (< x y)))
+     (< y x))
 
 (def (<= x y)
      (or (< x y) (eq x y)))
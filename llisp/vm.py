@@ -0,0 +1,175 @@
+"""
+Stack based virtual machine running the bytecode of llisp.compiler
+
+Procedure calls push a frame on an explicit stack instead of recursing in
+Python, and tail calls replace the current frame.
+"""
+
+from functools import partial
+from typing import Any, Dict, List, Tuple, Union
+
+from llisp.compiler import (
+    ASSIGN,
+    BINARY_OP,
+    CALL,
+    CALL_BUILTIN,
+    EVAL,
+    FOR_ITER,
+    GET_ITER,
+    JUMP,
+    JUMP_IF_BOUND,
+    JUMP_IF_FALSE,
+    JUMP_IF_FALSY,
+    JUMP_IF_TRUTHY,
+    LOAD_CONST,
+    LOAD_FAST,
+    LOAD_NAME,
+    LOAD_PROC,
+    POP,
+    RETURN,
+    STORE_NAME,
+    TAIL_CALL,
+    Code,
+    Instruction,
+    compile_proc,
+    compile_program,
+)
+from llisp.lbuiltins import (
+    UNBOUND,
+    VALUE_TYPES,
+    Atom,
+    Frame,
+    LList,
+    Name,
+    NotCallable,
+    UndefinedError,
+    assign,
+    bind,
+    is_true,
+    loop_range,
+)
+
+NAME = Atom.AtomTypes.NAME
+
+# Instructions, program counter, environment and stack of a calling frame
+Caller = Tuple[List[Instruction], int, Dict, List]
+
+
+def enter(proc: Name, args: List[Atom], env: Dict) -> Tuple[Code, Frame]:
+    """Code and frame environment of a call"""
+    definition = proc.value
+    if definition.code is None:
+        definition.code = compile_proc(definition)
+    frame = Frame(definition.scope, args, proc.env if proc.env is not None else env)
+    return definition.code, frame
+
+
+def run(code: Code, state: Dict) -> Atom:
+    """Run the code until it returns, keeping the frames of calls in a list"""
+    env: Any = state
+    frames: List[Caller] = []
+    instructions = code.instructions
+    pc = 0
+    stack: List = []
+    while True:
+        op, arg = instructions[pc]
+        pc += 1
+        if op == LOAD_FAST:
+            value = env.slots[arg[0]]
+            if value is UNBOUND:
+                value = arg[1].evaluate(env)
+            elif value.type not in VALUE_TYPES:
+                value = value.evaluate(env)
+            stack.append(value)
+        elif op == LOAD_NAME:
+            try:
+                value = env[arg]
+            except KeyError:
+                raise UndefinedError(f"{arg} Undefined")
+            if value.type not in VALUE_TYPES:
+                value = value.evaluate(env)
+            stack.append(value)
+        elif op == LOAD_CONST:
+            stack.append(arg)
+        elif op == BINARY_OP:
+            right = stack.pop()
+            stack.append(arg(stack.pop(), right))
+        elif op == JUMP_IF_FALSE:
+            if stack.pop().value == 0:
+                pc = arg
+        elif op == JUMP:
+            pc = arg
+        elif op == LOAD_PROC:
+            if type(arg) is Name:
+                try:
+                    proc = env[arg.value_str]
+                except KeyError:
+                    raise UndefinedError(f"ERR: Symbol {arg} unknown")
+            else:
+                proc = arg.lookup(env)
+            if proc.type != NAME:
+                raise NotCallable(f"{arg.value_str} not a procedure")
+            stack.append(proc)
+        elif op == CALL or op == TAIL_CALL:
+            args = stack[len(stack) - arg :]
+            del stack[len(stack) - arg :]
+            proc = stack.pop()
+            proc_code, proc_env = enter(proc, args, env)
+            if proc.memo is not None:
+                # Memoized calls run in a nested loop to store their result
+                stack.append(proc.memo.call(args, partial(run, proc_code, proc_env)))
+                continue
+            if op == CALL:
+                frames.append((instructions, pc, env, stack))
+                stack = []
+            instructions, pc, env = proc_code.instructions, 0, proc_env
+        elif op == RETURN:
+            result = stack.pop()
+            if not frames:
+                return result
+            instructions, pc, env, stack = frames.pop()
+            stack.append(result)
+        elif op == POP:
+            stack.pop()
+        elif op == STORE_NAME:
+            bind(env, arg.value, stack.pop())
+            stack.append(arg)
+        elif op == JUMP_IF_FALSY:
+            if not is_true(stack.pop()):
+                pc = arg
+        elif op == JUMP_IF_TRUTHY:
+            if is_true(stack.pop()):
+                pc = arg
+        elif op == CALL_BUILTIN:
+            builtin, action, count = arg
+            expr = LList()
+            expr.childs = [action] + stack[len(stack) - count :]
+            del stack[len(stack) - count :]
+            stack.append(builtin(expr, env))
+        elif op == JUMP_IF_BOUND:
+            if arg[0] in env:
+                pc = arg[1]
+        elif op == FOR_ITER:
+            i = next(stack[-1], None)
+            if i is None:
+                stack.pop()
+                pc = arg
+            else:
+                stack.append(Atom.from_value(i))
+        elif op == GET_ITER:
+            name, count = arg
+            bounds = stack[len(stack) - count :]
+            del stack[len(stack) - count :]
+            stack.append(iter(loop_range(name, bounds)))
+        elif op == ASSIGN:
+            assign(env, arg.value_str, stack.pop())
+            stack.append(arg)
+        elif op == EVAL:
+            stack.append(arg.evaluate(env))
+        else:
+            raise Exception(f"Unknown opcode {op}")
+
+
+def evaluate(node: Union[Atom, LList], state: Dict) -> Atom:
+    """Compile and run a top level form"""
+    return run(compile_program(node), state)
@@ -5,7 +5,7 @@ setup(
     version="0.1.0",
     author="Loïc CARR",
     author_email="loic.carr@gmail.com",
-    packages=["llisp"],
+    packages=["llisp", "llisp.bench"],
     description="My simple Lisp interpreter",
     entry_points={"console_scripts": ["llisplang = llisp.main:main"]},
 )
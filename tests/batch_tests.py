@@ -0,0 +1,64 @@
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from llisp import batch
+from llisp.lbuiltins import Name
+from llisp.main import load_std
+from llisp.parser import listing
+
+
+def scripts(tmp_path: Path, sources: List[str]) -> List[str]:
+    paths = []
+    for i, source in enumerate(sources):
+        path = tmp_path / f"script{i}.lisp"
+        path.write_text(source)
+        paths.append(str(path))
+    return paths
+
+
+def test_fresh_state() -> None:
+    std: Dict = {}
+    load_std(std)
+    state = batch.fresh_state(std)
+    assert state.keys() == std.keys()
+    reverse = state["reverse"]
+    assert isinstance(reverse, Name) and reverse.env is state
+    assert std["reverse"].env is std
+    # Redefinitions are seen by the std procedures of the state only
+    listing("(def (reverse l) l)").evaluate(state)
+    out = listing("(el (concat (list 1 2) (list 3)))")
+    assert out.evaluate(state).value == 2
+    assert out.evaluate(std).value == 1
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_run_many(tmp_path: Path, workers: int) -> None:
+    files = scripts(
+        tmp_path,
+        [
+            "(var x 2) (echo (* x 21))",
+            "(echo x)",
+            "(echo (len (reverse (list 1 2 3))))",
+            "(def (f n) (if (eq n 0) 0 (f (- n 1)))) (echo (f 10))",
+        ],
+    )
+    results = batch.run_many(files, workers)
+    assert [r.filename for r in results] == files
+    assert [r.out for r in results] == ["42", "", "3", "0"]
+    # Scripts do not see the globals of the others
+    assert [r.status for r in results] == [0, 1, 0, 0]
+    assert "x Undefined" in results[1].err
+
+
+def test_main(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    files = scripts(tmp_path, ["(print 1)", "(echo 2)"])
+    assert batch.main(["--workers", "2", *files]) == 0
+    captured = capsys.readouterr()
+    assert captured.out == f"==> {files[0]} <==\n1\n==> {files[1]} <==\n2\n"
+    assert captured.err.startswith("2 scripts, 0 failed")
+
+    files = scripts(tmp_path, ["(echo 1)", "(undefined)"])
+    assert batch.main(["--engine", "vm", *files]) == 1
+    assert f"FAILED (1): {files[1]}" in capsys.readouterr().err
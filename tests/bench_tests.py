@@ -0,0 +1,59 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from llisp import bench
+from llisp.bench import Benchmark, compare, macro, measure, micro
+from llisp.main import ENGINES
+
+
+def report(engine: str, **ops: float) -> Dict[str, Any]:
+    return {
+        "engine": engine,
+        "results": {name: {"ops": v, "rsd": 0.01} for name, v in ops.items()},
+    }
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_micro_benchmarks(engine: str) -> None:
+    for benchmark in micro.benchmarks():
+        benchmark.setup(engine)()
+
+
+def test_macro_benchmarks() -> None:
+    names = [b.name for b in macro.benchmarks()]
+    assert "euler/problem1" in names
+
+
+def test_measure() -> None:
+    calls: List[int] = []
+    result = measure(
+        Benchmark("count", lambda engine: lambda: calls.append(1), 10),
+        "tree",
+        repeat=3,
+        min_time=0.001,
+    )
+    assert len(result["samples"]) == 3
+    assert result["ops"] > 0 and result["stdev"] >= 0
+    assert len(calls) > 3
+
+
+def test_compare() -> None:
+    baseline = report("tree", a=100, b=100, c=100)
+    lines: List[str] = []
+    regressions = compare(
+        baseline, report("tree", a=95, b=50, c=200, d=1), lines.append
+    )
+    assert regressions == ["b"]
+    assert len(lines) == 3
+
+
+def test_main_json(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    output = tmp_path / "results.json"
+    assert bench.main("tree", repeat=2, pattern="reader", output=str(output)) == 0
+    results = json.loads(output.read_text())
+    assert list(results["results"]) == ["reader"]
+    bench.main("tree", repeat=2, pattern="reader", baseline=str(output))
+    assert "Compared to" in capsys.readouterr().out
@@ -0,0 +1,11 @@
+from typing import Iterator
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def cache_dir(tmp_path_factory: pytest.TempPathFactory) -> Iterator[None]:
+    """Keep the std snapshots of the tests out of the user cache"""
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setenv("LLISP_CACHE_DIR", str(tmp_path_factory.mktemp("cache")))
+        yield
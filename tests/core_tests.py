@@ -1,19 +1,51 @@
-from typing import Dict, List
+import pickle
+import sys
+from typing import Dict, Iterator, List
 
 import pytest
 
-from llisp.lbuiltins import NotCallable, ParseError, UndefinedError, is_int
+from llisp import compiler, lbuiltins, vm
+from llisp.compiler import compile_program
+from llisp.lbuiltins import (
+    FALSE,
+    TRUE,
+    Atom,
+    Cons,
+    Environment,
+    Global,
+    LList,
+    Local,
+    Name,
+    NotCallable,
+    ParseError,
+    State,
+    UndefinedError,
+    create_atom,
+    is_int,
+    memoize,
+)
+from llisp.main import ENGINES
 from llisp.parser import create_program
 
 
 def simple_multi(test_inputs: List[str], expected: str) -> None:
-    state: Dict[str, object] = {}
-    out = None
-    for t in test_inputs:
-        prog = create_program(t)
-        out = prog.run(state).value
+    for evaluate in ENGINES.values():
+        state: Dict[str, object] = {}
+        out = None
+        for t in test_inputs:
+            for form in create_program(t).childs:
+                out = evaluate(form, state).value
+
+        assert str(out) == expected
+
 
-    assert str(out) == expected
+def raises_multi(test_inputs: List[str], exception: type) -> None:
+    for evaluate in ENGINES.values():
+        state: Dict[str, object] = {}
+        with pytest.raises(exception):
+            for t in test_inputs:
+                for form in create_program(t).childs:
+                    evaluate(form, state)
 
 
 @pytest.mark.parametrize(
@@ -37,8 +69,7 @@ def test_is_int(test_input: str, expected: bool) -> None:
     "test_input,expected", [("'1'", "1"), ("'a'", "a"), ("' '", " "), ("'\n'", "\n")]
 )
 def test_compute_char(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
 @pytest.mark.parametrize(
@@ -48,15 +79,14 @@ def test_compute_char(test_input: str, expected: str) -> None:
         ("(+ 1 1)", "2"),
         ("(+ 2 1)", "3"),
         ("(+ (+ 5 2) 1)", "8"),
-        ("(+ (+ 5 2) (+ 3 9)", "19"),
-        ("(+ (+ 5 (+ 2 2) (+ 3 9)", "21"),
+        ("(+ (+ 5 2) (+ 3 9))", "19"),
+        ("(+ (+ 5 (+ 2 2) (+ 3 9)))", "21"),
         ("(+ 1 -1)", "0"),
         ("(+ 1 1 1)", "3"),
     ],
 )
 def test_compute_plus(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
 # Two tests here have been distabled as I am not sure on how I want to
@@ -73,25 +103,19 @@ def test_compute_plus(test_input: str, expected: str) -> None:
     ],
 )
 def testParseError(test_input: str) -> None:
-    with pytest.raises(ParseError):
-        prog = create_program(test_input)
-        prog.run({})
+    raises_multi([test_input], ParseError)
 
 
 @pytest.mark.parametrize("test_input", ["(a)", "(var a a)", "(list a b)"])
 def testUndefinedError(test_input: str) -> None:
-    with pytest.raises(UndefinedError):
-        prog = create_program(test_input)
-        prog.run({})
+    raises_multi([test_input], UndefinedError)
 
 
 @pytest.mark.parametrize(
     "test_input", ["(var a 10) (a 10)", "(var x (list 1 10)) (x 10)"]
 )
 def testNotCallableError(test_input: str) -> None:
-    with pytest.raises(NotCallable):
-        prog = create_program(test_input)
-        prog.run({})
+    raises_multi([test_input], NotCallable)
 
 
 @pytest.mark.parametrize(
@@ -107,8 +131,7 @@ def testNotCallableError(test_input: str) -> None:
     ],
 )
 def test_compute_divide(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
 @pytest.mark.parametrize(
@@ -125,8 +148,7 @@ def test_compute_divide(test_input: str, expected: str) -> None:
     ],
 )
 def test_compute_divide_int(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
 @pytest.mark.parametrize(
@@ -143,17 +165,14 @@ def test_compute_divide_int(test_input: str, expected: str) -> None:
     ],
 )
 def test_compute_mod(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
-@pytest.mark.skip("The ! operator is not a builtin, but a std")
 @pytest.mark.parametrize(
     "test_input,expected", [("(! 1)", "0"), ("(! 0)", "1"), ("(! 10)", "0")]
 )
 def test_compute_not(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
 @pytest.mark.parametrize(
@@ -166,8 +185,7 @@ def test_compute_not(test_input: str, expected: str) -> None:
     ],
 )
 def test_compute_minus(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
 @pytest.mark.parametrize(
@@ -176,16 +194,11 @@ def test_compute_minus(test_input: str, expected: str) -> None:
         ("(echo 1)", "1"),
         ("(echo 1.)", "1.0"),
         ("(echo '%')", "%"),
-        # TODO: possible bug here, we might want to echo "test" or ['t', 'e', 's', 't']
-        (
-            '(echo "test")',
-            "[(AtomTypes.CHAR) t, (AtomTypes.CHAR) e, (AtomTypes.CHAR) s, (AtomTypes.CHAR) t]",
-        ),
+        ('(echo "test")', "test"),
     ],
 )
 def test_compute_echo(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
 # TODO: the difference between echo and print is... strange
@@ -195,15 +208,11 @@ def test_compute_echo(test_input: str, expected: str) -> None:
         ("(print 1)", "1"),
         ("(print 1.)", "1.0"),
         ("(print '%')", "%"),
-        (
-            '(print "test")',
-            "[(AtomTypes.CHAR) t, (AtomTypes.CHAR) e, (AtomTypes.CHAR) s, (AtomTypes.CHAR) t]",
-        ),
+        ('(print "test")', "test"),
     ],
 )
 def test_compute_print(test_input: str, expected: str) -> None:
-    prog = create_program(test_input)
-    assert str(prog.run({}).value) == expected
+    return simple_multi([test_input], expected)
 
 
 @pytest.mark.parametrize(
@@ -290,11 +299,11 @@ def test_compute_if(test_inputs: List[str], expected: str) -> None:
             ],
             "10",
         ),
-        (["(def (eqbis x y) (if (eq x y) 1 0)", "(eqbis 72 72)"], "1"),
-        (["(def (eqbis x y) (if (eq x y) 1 0)", "(eqbis 72 79)"], "0"),
+        (["(def (eqbis x y) (if (eq x y) 1 0))", "(eqbis 72 72)"], "1"),
+        (["(def (eqbis x y) (if (eq x y) 1 0))", "(eqbis 72 79)"], "0"),
         (
             [
-                "(def (eqbis x y) (if (eq x y) 1 0)",
+                "(def (eqbis x y) (if (eq x y) 1 0))",
                 "(var x 10)",
                 "(var b 100)",
                 "(eqbis x b)",
@@ -303,7 +312,7 @@ def test_compute_if(test_inputs: List[str], expected: str) -> None:
         ),
         (
             [
-                "(def (eqbis x y) (if (eq x y) 1 0)",
+                "(def (eqbis x y) (if (eq x y) 1 0))",
                 "(var x 10)",
                 "(var b 10)",
                 "(eqbis x b)",
@@ -312,7 +321,7 @@ def test_compute_if(test_inputs: List[str], expected: str) -> None:
         ),
         (
             [
-                "(def (eqbis x y) (if (eq x y) 1 0)",
+                "(def (eqbis x y) (if (eq x y) 1 0))",
                 "(var x 10)",
                 "(var b x)",
                 "(eqbis x b)",
@@ -349,7 +358,7 @@ def test_compute_recursive_def(test_inputs: List[str], expected: str) -> None:
     "test_inputs,expected",
     [
         (["(var x 5) (var y 10) (+ x y)"], "15"),
-        (["(def (albert x) ((var y 10) (+ x y))", "(albert 12)"], "22"),
+        (["(def (albert x) ((var y 10) (+ x y)))", "(albert 12)"], "22"),
     ],
 )
 def test_compute_multi_expr(test_inputs: List[str], expected: str) -> None:
@@ -373,10 +382,618 @@ def test_compute_list(test_inputs: List[str], expected: str) -> None:
 @pytest.mark.parametrize(
     "test_inputs,expected",
     [
-        (['(var x "a"', "(eq x (list 'a'))"], "1"),
-        (['(var x "abcd"', "(eq x (list 'a' 'b' 'c' 'd'))"], "1"),
-        (['(var x "ab d"', "(eq x (list 'a' 'b' ' ' 'd'))"], "1"),
+        (['(var x "a")', "(eq x (list 'a'))"], "1"),
+        (['(var x "abcd")', "(eq x (list 'a' 'b' 'c' 'd'))"], "1"),
+        (['(var x "ab d")', "(eq x (list 'a' 'b' ' ' 'd'))"], "1"),
     ],
 )
 def test_compute_str(test_inputs: List[str], expected: str) -> None:
     return simple_multi(test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "value,expected_type,expected_str",
+    [
+        (1, Atom.AtomTypes.NUM, "1"),
+        (-1000, Atom.AtomTypes.NUM, "-1000"),
+        (2.5, Atom.AtomTypes.NUM, "2.5"),
+        ("a", Atom.AtomTypes.CHAR, "a"),
+    ],
+)
+def test_atom_from_value(value, expected_type, expected_str: str) -> None:
+    atom = Atom.from_value(value)
+    assert atom.value == value
+    assert atom.type == expected_type
+    assert atom.value_str == expected_str
+    assert atom == Atom(str(value) if expected_type == Atom.AtomTypes.NUM else "'a'")
+
+
+def test_atom_interning() -> None:
+    assert Atom.from_value(42) is Atom.from_value(42)
+    assert create_program("(+ 40 2)").run({}) is Atom.from_value(42)
+    assert create_program("(eq 1 1)").run({}) is TRUE
+    assert create_program("(< 2 1)").run({}) is FALSE
+    assert Atom.from_value("a") is create_atom("'a'")
+    chars = list(create_program('(string->list "aba")').run({}).value)
+    assert chars[0] is chars[2]
+
+
+def test_compact_nodes() -> None:
+    state: Dict = {}
+    create_program("(def (f x) (+ x 1.5))").run(state)
+    for node in (Atom.from_value(1.5), state["f"], LList()):
+        assert not hasattr(node, "__dict__")
+    assert Atom.from_value(1.5).value_str == "1.5"
+
+    definition = pickle.loads(pickle.dumps(state["f"].value))
+    assert definition == state["f"].value
+    assert definition.scope.slots == {"x": 0}
+    assert definition.closure is None and definition.code is None
+
+
+def test_environment_chain() -> None:
+    parent = Environment({"x": 1, "y": 2})
+    child = Environment({"x": 10}, parent)
+    assert child["x"] == 10 and child["y"] == 2
+    assert "y" in child and "z" not in child
+    child["z"] = 3
+    assert "z" not in parent
+    with pytest.raises(KeyError):
+        child["w"]
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_state_fork(engine: str) -> None:
+    base = State()
+    for form in create_program("(var x 1) (def (f) x)").childs:
+        ENGINES[engine](form, base)
+    base.freeze()
+    with pytest.raises(Exception, match="frozen"):
+        ENGINES[engine](create_program("(var y 1)").childs[0], base)
+
+    first, second = base.fork(), base.fork()
+    for form in create_program("(var x 2) (def (g) (+ x (f)))").childs:
+        ENGINES[engine](form, first)
+    assert ENGINES[engine](create_program("(g)").childs[0], first).value == 3
+    assert dict(first).keys() == {"x", "g"}
+    assert "g" not in second and second["x"].value == 1
+
+    # Procedures resolve globals in the layer they are defined in
+    nested = first.fork({"x": Atom.from_value(5)})
+    assert ENGINES[engine](create_program("(+ x (g))").childs[0], nested).value == 8
+    assert first["x"].value == 2
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_state_fork_memoize(engine: str) -> None:
+    base = State()
+    source = (
+        "(def (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2))))) (defmemo (g x) x)"
+    )
+    for form in create_program(source).childs:
+        ENGINES[engine](form, base)
+    base.freeze()
+    first, second = base.fork(), base.fork()
+
+    def run(source: str, state: State) -> Atom:
+        return ENGINES[engine](create_program(source).childs[0], state)
+
+    run("(memoize fib)", first)
+    assert run("(fib 30)", first).value == 832040
+    assert run("(memo-stats fib)", first).value.childs[1].value == 31
+    assert base["fib"].memo is None and second["fib"].memo is None
+    with pytest.raises(NotCallable):
+        run("(memo-stats fib)", second)
+
+    run("(g 1)", second)
+    run("(memo-clear g)", first)
+    assert run("(memo-stats g)", second).value.childs[2].value == 1
+    assert run("(memo-stats g)", first).value.childs[2].value == 0
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_state_fork_set(engine: str) -> None:
+    base = State()
+    ENGINES[engine](create_program("(var x 1)").childs[0], base)
+    first, second = base.fork(), base.fork()
+    for form in create_program("(set! x 7) (def (f) (set! x (+ x 1))) (f)").childs:
+        ENGINES[engine](form, first)
+    assert dict(first)["x"].value == 8
+    assert base["x"].value == 1 and second["x"].value == 1
+
+    # Bindings of a frozen base are shadowed in the fork
+    base.freeze()
+    third = base.fork()
+    ENGINES[engine](create_program("(set! x 3)").childs[0], third)
+    assert third["x"].value == 3 and base["x"].value == 1
+    with pytest.raises(UndefinedError):
+        ENGINES[engine](create_program("(set! y 3)").childs[0], third)
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (["(def (f x) (def (g y) (+ x y)) (g 1))", "(f 41)"], "42"),
+        (["(var x 1)", "(def (f x) x)", "(f 5)", "x"], "1"),
+        (["(def (f x) (var y 2) (* x y))", "(f 3)", "(var y 7)", "y"], "7"),
+        (["(def (f n) (if (eq n 0) 0 (+ 1 (f (- n 1)))))", "(f 500)"], "500"),
+        (
+            [
+                "(def (f x) (def (g y) (def (h z) (+ x (* y z))) (h 3)) (g 2))",
+                "(f 1)",
+            ],
+            "7",
+        ),
+        (["(var y 1)", "(def (f) (var a y) (var y 2) (+ a y))", "(f)"], "3"),
+        (["(def (f x) (var x (+ x 1)) x)", "(f 1)"], "2"),
+        (["(def (f x) (def (g) x) (var x 5) (g))", "(f 1)"], "5"),
+        (["(var y 0)", "(def (f x y) y)", "(f 1)"], "0"),
+        (["(def (f x) x)", "(f 1 2)"], "1"),
+    ],
+)
+def test_compute_scopes(test_inputs: List[str], expected: str) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "test_inputs",
+    [
+        ["(def (f x) (var y 2) x)", "(f 1)", "y"],
+        ["(def (f x y) y)", "(f 1)"],
+        ["(def (f) (var a b) (var b 1) a)", "(f)"],
+    ],
+)
+def test_local_var_undefined(test_inputs: List[str]) -> None:
+    raises_multi(test_inputs, UndefinedError)
+
+
+def test_resolve_references() -> None:
+    state: Dict = {}
+    create_program("(def (f x) (var y x) (def (g) (+ x (* y z))) (g))").run(state)
+    definition = state["f"].value
+    assert definition.scope.slots == {"x": 0, "y": 1, "g": 2}
+    var, nested, call = definition.childs[2:]
+    assert isinstance(var.childs[2], Local)
+    assert (var.childs[2].depth, var.childs[2].index) == (0, 0)
+    assert type(var.childs[1]) is Name
+    assert isinstance(call.childs[0], Local) and call.childs[0].index == 2
+
+    create_program("(var z 3) (f 2)").run(state)
+    g = state["f"].value.childs[3].childs[2].childs
+    x, product = g[1:]
+    assert (x.depth, x.index) == (1, 0)
+    assert isinstance(product.childs[2], Global) and product.childs[2].depth == 2
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (["(def (f) 1)", "(def (g) (f))", "(g)", "(def (f) 2)", "(g)"], "2"),
+        (["(def (f) 1)", "(def (g) (f))", "(g)", "(var f 3)", "f"], "3"),
+        (["(def (f x) x)", "(f 1)", "(def (f x) (+ x 1))", "(f 1)"], "2"),
+        (["(def (g n) (if (eq n 0) 0 (g (- n 1))))", "(g 3)", "(g 4)"], "0"),
+    ],
+)
+def test_call_cache(test_inputs: List[str], expected: str) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+def test_call_cache_invalidation() -> None:
+    state: Dict = {}
+    create_program("(def (f) 1) (def (g) (f))").run(state)
+    call = create_program("(g)").childs[0]
+    assert call.evaluate(state).value == 1
+    assert call.cache is not None and call.cache[3] is state["g"]
+    create_program("(var f 2)").run(state)
+    with pytest.raises(NotCallable):
+        call.evaluate(state)
+
+    # The same body, cached in a state, runs in another one
+    other: Dict = {}
+    create_program("(def (f) 3)").run(other)
+    other["g"] = Name("g", state["g"].value, state["g"].params, other)
+    assert call.evaluate(other).value == 3
+
+
+def test_call_cache_stale() -> None:
+    raises_multi(
+        ["(def (f) 1)", "(def (call) (if 1 (f)))", "(call)", "(var f 5)", "(call)"],
+        NotCallable,
+    )
+
+
+def test_call_cache_frame() -> None:
+    simple_multi(
+        [
+            "(def (test) (var s 0) (def (f) 2) (dotimes (j 2) "
+            "(dotimes (i (f)) (set! s (+ s 1))) (def (f) 3)) s)",
+            "(test)",
+        ],
+        "5",
+    )
+
+
+@pytest.fixture
+def low_recursion_limit() -> Iterator[None]:
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(1_000)
+    yield
+    sys.setrecursionlimit(limit)
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (
+            ["(def (f n acc) (if (eq n 0) acc (f (- n 1) (+ acc 2))))", "(f 5000 0)"],
+            "10000",
+        ),
+        (["(def (f n) ((var m (- n 1)) (if (eq n 0) 7 (f m))))", "(f 5000)"], "7"),
+        (
+            [
+                "(def (even n) (if (eq n 0) 1 (odd (- n 1))))",
+                "(def (odd n) (if (eq n 0) 0 (even (- n 1))))",
+                "(even 5001)",
+            ],
+            "0",
+        ),
+    ],
+)
+def test_tail_calls(
+    low_recursion_limit: None, test_inputs: List[str], expected: str
+) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (["(var x 1)", "(set! x (+ x 1))", "x"], "2"),
+        (["(def (f x) (set! x (* x 2)) x)", "(f 4)"], "8"),
+        (["(var n 0)", "(def (f) (set! n (+ n 1)))", "(f)", "(f)", "n"], "2"),
+        (["(def (f) (var c 0) (def (g) (set! c (+ c 1))) (g) (g) c)", "(f)"], "2"),
+        (["(var x 1)", "(def (f x) (set! x 5))", "(f 2)", "x"], "1"),
+        (["(var i 0)", "(while (< i 5) (set! i (+ i 1)))", "i"], "5"),
+        (["(var i 0)", "(while (< i 5) (set! i (+ i 1)))"], "0"),
+        (["(var s 0)", "(dotimes (i 5) (set! s (+ s i)))", "s"], "10"),
+        (["(var s 0)", "(dotimes (i 0) (set! s 1))", "s"], "0"),
+        (["(var s 0)", "(for (i 2 5) (set! s (+ s i)))", "s"], "9"),
+        (["(var s 0)", "(for (i 10 0 -3) (set! s (+ (* s 10) i)))", "s"], "10741"),
+        (
+            [
+                "(def (f n) (var s 0) (dotimes (i n) (for (j 0 i) (set! s (+ s j)))) s)",
+                "(f 5)",
+            ],
+            "10",
+        ),
+        (
+            ["(def (f n) (var k 0) (while (< k n) (set! k (+ k 1))) k)", "(f 20000)"],
+            "20000",
+        ),
+        (
+            [
+                "(def (sq x) (* x x))",
+                "(var s 0)",
+                "(for (i 0 (+ 2 1)) (set! s (+ s (sq i))))",
+                "s",
+            ],
+            "5",
+        ),
+    ],
+)
+def test_loops(
+    low_recursion_limit: None, test_inputs: List[str], expected: str
+) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "test_inputs,exception",
+    [
+        (["(set! x 1)"], UndefinedError),
+        (["(def (f) (set! y 1))", "(f)"], UndefinedError),
+        (["(set! 1 2)"], ParseError),
+        (["(dotimes i 3)"], ParseError),
+        (["(for (i 1) i)"], ParseError),
+        (["(dotimes (i (list 1)) i)"], Exception),
+        (["(for (i 0 3 0) i)"], Exception),
+    ],
+)
+def test_loops_errors(test_inputs: List[str], exception: type) -> None:
+    raises_multi(test_inputs, exception)
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (["(max 1 2)"], "2"),
+        (["(def (max a b) 99)", "(max 1 2)"], "99"),
+        (["(def (len l) 42)", "(len (list 1))"], "42"),
+        (["(def (> a b) 7)", "(> 1 2)"], "7"),
+        (["(def (and a b) 5)", "(and 0 0)"], "5"),
+        (["(def (vec n) n)", "(vec 3)"], "3"),
+        (["(def (for x) x)", "(for 5)"], "5"),
+        (["(def (f) (max 1 2))", "(f)", "(def (max a b) 99)", "(f)"], "99"),
+        (["(def (f) (var s (max 1 2)) s)", "(f)", "(def (max a b) 9)", "(f)"], "9"),
+        (["(def (f max) (+ max (min max 1)))", "(f 5)"], "6"),
+        (["(def (f) (def (abs x) 0) (abs -1))", "(f)"], "0"),
+        (["(def (+ a b) 0)", "(+ 1 2)"], "3"),
+    ],
+)
+def test_redefine_natives(test_inputs: List[str], expected: str) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+def test_native_call_cache() -> None:
+    state = State()
+    create_program("(def (f) (max 1 2)) (f)").run(state)
+    call = state["f"].value.childs[2]
+    # Cached while max is unbound in the globals reached through the frames
+    assert call.cache is not None and call.cache[2] is state
+    assert create_program("(f)").run(state).value == 2
+    create_program("(var max 3)").run(state)
+    with pytest.raises(NotCallable):
+        create_program("(f)").run(state)
+    for engine in ENGINES:
+        with pytest.raises(NotCallable):
+            ENGINES[engine](create_program("(f)").childs[0], state)
+
+
+def test_loop_locals() -> None:
+    state: Dict = {}
+    create_program("(def (f n) (dotimes (i n) (for (j i n) (g i j))))").run(state)
+    definition = state["f"].value
+    assert definition.scope.slots == {"n": 0, "i": 1, "j": 2}
+    (loop,) = definition.childs[2:]
+    variable, count = loop.childs[1].childs
+    assert type(variable) is Name
+    assert isinstance(count, Local) and (count.depth, count.index) == (0, 0)
+    inner = loop.childs[2]
+    assert [type(c) for c in inner.childs[1].childs] == [Name, Local, Local]
+    call = inner.childs[2]
+    assert [(c.depth, c.index) for c in call.childs[1:]] == [(0, 1), (0, 2)]
+
+    # Loop variables are bound in the state at the top level
+    create_program("(dotimes (k 3) k)").run(state)
+    assert state["k"].value == 2
+
+
+def test_loop_call_cache() -> None:
+    state: Dict = {}
+    create_program("(def (f x) x) (var s 0)").run(state)
+    loop = create_program("(dotimes (i 3) (set! s (+ s (f i))))").childs[0]
+    loop.evaluate(state)
+    assert state["s"].value == 3
+    # Binding numbers to the loop variable keeps the call sites cached
+    call = loop.childs[2].childs[2].childs[2]
+    assert call.cache is not None and call.cache[3] is state["f"]
+    assert call.cache[0] == lbuiltins.VERSION
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (
+            ["(push 0 (list 1 2))"],
+            "[(AtomTypes.NUM) 0, (AtomTypes.NUM) 1, (AtomTypes.NUM) 2]",
+        ),
+        (["(pop (list 1 2))"], "[(AtomTypes.NUM) 2]"),
+        (["(pop (pop (list 1)))"], "[]"),
+        (["(el (push 3 (list 1 2)))"], "3"),
+        (["(var x (list 1 2))", "(var y (push 0 x))", "(eq x (pop y))"], "1"),
+        (
+            ["(var x (list 1 2))", "(push 0 x)", "x"],
+            "[(AtomTypes.NUM) 1, (AtomTypes.NUM) 2]",
+        ),
+        (["(eq (list 1 2) (list 1 2 3))"], "0"),
+    ],
+)
+def test_compute_list_ops(test_inputs: List[str], expected: str) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+def test_cons_sharing() -> None:
+    tail = Cons.from_iterable([Atom.from_value(i) for i in range(3)])
+    cons = Cons(Atom.from_value(-1), tail)
+    assert cons.tail is tail
+    assert len(cons) == 4 and cons.childs[1:] == list(tail)
+    assert cons == Cons.from_iterable(cons)
+    assert str(cons) == str([Atom.from_value(i) for i in range(-1, 3)])
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (
+            ["(vector 1 2 3)"],
+            "#[(AtomTypes.NUM) 1, (AtomTypes.NUM) 2, (AtomTypes.NUM) 3]",
+        ),
+        (["(nth (vector 4 5 6) 1)"], "5"),
+        (["(nth (vector 'a' 'b') 0)"], "a"),
+        (["(vlen (vector 4 5 6))"], "3"),
+        (["(vlen (vec (list 1 2)))"], "2"),
+        (["(vlist (vector 1 2))"], "[(AtomTypes.NUM) 1, (AtomTypes.NUM) 2]"),
+        (["(var v (vector 1 2 3))", "(vset v 0 10)", "(nth v 0)"], "10"),
+        (["(vslice (vector 1 2 3 4) 1 3)"], "#[(AtomTypes.NUM) 2, (AtomTypes.NUM) 3]"),
+        (["(vlen (vslice (vector 1 2 3 4) 1))"], "3"),
+        (["(vsum (vector 1 2 3.5))"], "6.5"),
+        (["(vdot (vector 1 2 3) (vector 4 5 6))"], "32"),
+        (
+            ["(v+ (vector 1 2) (vector 10 20))"],
+            "#[(AtomTypes.NUM) 11, (AtomTypes.NUM) 22]",
+        ),
+        (["(v* (vector 1 2) 3)"], "#[(AtomTypes.NUM) 3, (AtomTypes.NUM) 6]"),
+        (["(eq (v* 2 (vector 1 2)) (vector 2 4))"], "1"),
+        (["(eq (vector 1 2) (list 1 2))"], "0"),
+        (['(nth (vector "ab" "cd") 1)'], "cd"),
+        (['(eq (nth (vector "ab") 0) "ab")'], "1"),
+        (['(eq (nth (vector "a") 0) "a")'], "1"),
+        (["(eq (vlist (vec (list \"ab\" 'c' 1))) (list \"ab\" 'c' 1))"], "1"),
+        (["(var v (vector 1 2))", '(vset v 1 "xy")', "(strlen (nth v 1))"], "2"),
+        (["(defmemo (f v) (vlen v))", '(f (vector 1 "a"))', '(f (vector 1 "a"))'], "2"),
+    ],
+)
+def test_compute_vector(test_inputs: List[str], expected: str) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "test_input",
+    ["(vlen (list 1))", "(vdot (vector 1) (vector 1 2))", "(v+ (vector 1) (list 1))"],
+)
+def test_vector_errors(test_input: str) -> None:
+    raises_multi([test_input], Exception)
+
+
+def test_vector_strings() -> None:
+    state: Dict = {}
+    create_program('(var v (vector "ab" (string-append "c" "d")))').run(state)
+    chars = len(lbuiltins.CHARS)
+    out = create_program("(nth v 0)").run(state)
+    assert out.type == Atom.AtomTypes.STRING and out.value == "ab"
+    assert Atom.from_value("abc").type == Atom.AtomTypes.STRING
+    assert len(lbuiltins.CHARS) == chars
+
+
+def test_compile_program() -> None:
+    code = compile_program(create_program("(if (< x 1) 2 (f x))").childs[0])
+    ops = [op for op, _ in code.instructions]
+    assert ops == [
+        compiler.LOAD_NAME,
+        compiler.LOAD_CONST,
+        compiler.BINARY_OP,
+        compiler.JUMP_IF_FALSE,
+        compiler.LOAD_CONST,
+        compiler.JUMP,
+        compiler.LOAD_PROC,
+        compiler.LOAD_NAME,
+        compiler.CALL,
+        compiler.RETURN,
+    ]
+
+
+def test_vm_deep_recursion(low_recursion_limit: None) -> None:
+    state: Dict = {}
+    for form in create_program(
+        "(def (f n) (if (eq n 0) 0 (+ 1 (f (- n 1))))) (f 5000)"
+    ).childs:
+        result = vm.evaluate(form, state)
+    assert result.value == 5000
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (
+            [
+                "(defmemo (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))",
+                "(fib 90)",
+            ],
+            "2880067194370816120",
+        ),
+        (
+            [
+                "(defmemo (fib n) (if (< n 2) n (+ (fib (- n 1)) (fib (- n 2)))))",
+                "(fib 10)",
+                "(fib 10)",
+                "(memo-stats fib)",
+            ],
+            "[(AtomTypes.NUM) 9, (AtomTypes.NUM) 11, (AtomTypes.NUM) 11, "
+            "(AtomTypes.NUM) 1024]",
+        ),
+        (
+            [
+                "(def (f n) (if (eq n 0) 0 (f (- n 1))))",
+                "(memoize f 3)",
+                "(f 10)",
+                "(memo-stats f)",
+            ],
+            "[(AtomTypes.NUM) 0, (AtomTypes.NUM) 11, (AtomTypes.NUM) 3, "
+            "(AtomTypes.NUM) 3]",
+        ),
+        (
+            [
+                "(defmemo (f l) (len l))",
+                "(f (list 1 2))",
+                "(f (list 1 2))",
+                "(memo-clear f)",
+                "(f (list 1 2))",
+                "(memo-stats f)",
+            ],
+            "[(AtomTypes.NUM) 0, (AtomTypes.NUM) 1, (AtomTypes.NUM) 1, "
+            "(AtomTypes.NUM) 1024]",
+        ),
+        (["(defmemo (f x) x)", "(def (f x) x)", "(memoize f)"], "f"),
+    ],
+)
+def test_memoize(test_inputs: List[str], expected: str) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "test_inputs,error",
+    [
+        (["(memoize f)"], UndefinedError),
+        (["(var x 1)", "(memoize x)"], NotCallable),
+        (["(def (f x) x)", "(memo-stats f)"], NotCallable),
+        (["(def (f x) x)", "(memoize f 0)"], ValueError),
+    ],
+)
+def test_memoize_errors(test_inputs: List[str], error: type) -> None:
+    raises_multi(test_inputs, error)
+
+
+def test_memoize_python() -> None:
+    state: Dict = {}
+    create_program("(def (sq x) (* x x))").run(state)
+    memo = memoize(state["sq"], maxsize=2).memo
+    create_program("(sq 2) (sq 3) (sq 2) (sq 4)").run(state)
+    assert memo.stats() == {"hits": 1, "misses": 3, "size": 2, "maxsize": 2}
+    # 3 was the least recently used argument
+    num = Atom.AtomTypes.NUM
+    assert list(memo.cache) == [((num, 2),), ((num, 4),)]
+    memo.clear()
+    assert memo.stats()["size"] == 0
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (['(strlen "hello")'], "5"),
+        (['(strlen "")'], "0"),
+        (['(char-at "hello" 1)'], "e"),
+        (['(string-append "ab" "" "cd")'], "abcd"),
+        (['(string-append "ab")'], "ab"),
+        (['(substring "hello" 1 3)'], "el"),
+        (['(substring "hello" 2)'], "llo"),
+        (['(string= "ab" "ab")'], "1"),
+        (['(string= "ab" "abc")'], "0"),
+        (['(eq "ab" "ab")'], "1"),
+        (['(string->list "ab")'], "[(AtomTypes.CHAR) a, (AtomTypes.CHAR) b]"),
+        (["(list->string (list 'a' 'b'))"], "ab"),
+        (['(list->string (string->list "a b"))'], "a b"),
+        (['(len "abc")'], "3"),
+        (['(el "abc")'], "a"),
+        (['(pop "abc")'], "bc"),
+        (["(push 'a' \"bc\")"], "abc"),
+        (['(eq (pop "a") (list))'], "1"),
+        (["(eq \"ab\" (list 'a' 1))"], "0"),
+    ],
+)
+def test_compute_string(test_inputs: List[str], expected: str) -> None:
+    return simple_multi(test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "test_input",
+    [
+        "(strlen (list 'a'))",
+        '(char-at "abc" 3)',
+        "(char-at \"abc\" 'a')",
+        '(string-append "a" 1)',
+        "(list->string (list 1 2))",
+        '(el "")',
+    ],
+)
+def test_string_errors(test_input: str) -> None:
+    raises_multi([test_input], Exception)
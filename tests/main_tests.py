@@ -0,0 +1,157 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pytest
+
+from llisp.lbuiltins import Name, ParseError
+from llisp.main import (
+    ENGINES,
+    FormCache,
+    arguments,
+    execute_file,
+    is_complete,
+    load_std,
+    repl,
+    snapshot_path,
+)
+from llisp.optimizer import Optimizer, dump
+from llisp.parser import listing
+
+
+def test_execute_file_forms(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    script = tmp_path / "script.lisp"
+    script.write_text("5\n(var x 2)\n(echo x)\n(def (f y)\n  (* x y))\n(echo (f 21))\n")
+    state: Dict[str, object] = {}
+    assert execute_file(str(script), state) == 0
+    assert capsys.readouterr().out == "242"
+    assert state["x"].value == 2  # type: ignore
+
+
+def test_execute_file_streams(tmp_path: Path, capsys: pytest.CaptureFixture) -> None:
+    script = tmp_path / "script.lisp"
+    script.write_text("(echo 1)\n(echo 2)\n(echo 'unterminated\n")
+    with pytest.raises(ParseError):
+        execute_file(str(script), {})
+    assert capsys.readouterr().out == "12"
+
+
+def test_std_snapshot(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("LLISP_CACHE_DIR", str(tmp_path))
+    path = Path(snapshot_path())
+    assert path.parent == tmp_path and not path.exists()
+
+    loaded: Dict[str, object] = {}
+    load_std(loaded)
+    assert path.exists()
+
+    restored: Dict[str, object] = {}
+    load_std(restored)
+    # Snapshots of other versions of the sources are removed on save
+    stale = tmp_path / "std-00000000.pickle"
+    stale.write_bytes(b"")
+    path.unlink()
+    load_std({})
+    assert sorted(tmp_path.iterdir()) == [path]
+    assert restored.keys() == loaded.keys()
+    assert restored["pi"] == loaded["pi"]
+    reverse = restored["reverse"]
+    assert isinstance(reverse, Name) and reverse.env is restored
+    # std procedures resolve globals in the state they are restored in
+    listing("(def (reverse l) l)").evaluate(restored)
+    out = listing("(el (concat (list 1 2) (list 3)))").evaluate(restored)
+    assert out.value == 2
+
+
+def test_std_snapshot_corrupted(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("LLISP_CACHE_DIR", str(tmp_path))
+    Path(snapshot_path()).write_bytes(b"not a snapshot")
+    state: Dict[str, object] = {}
+    load_std(state)
+    assert listing("(len (list 1 2))").evaluate(state).value == 2
+
+
+@pytest.mark.parametrize(
+    "source,complete",
+    [
+        ("(+ 1 2)", True),
+        ("(def (f x)", False),
+        ("(def (f x)\n  (* x 2))", True),
+        ('(echo "(")', True),
+        ('(echo "a', False),
+        ("(echo ')')", True),
+        ("x", True),
+        ("", True),
+    ],
+)
+def test_is_complete(source: str, complete: bool) -> None:
+    assert is_complete(source) == complete
+
+
+@pytest.mark.parametrize(
+    "argv, command, file",
+    [
+        ([], "run", ""),
+        (["script.lisp"], "run", "script.lisp"),
+        (["--engine", "vm", "run-many"], "run", "run-many"),
+        (["run", "serve"], "run", "serve"),
+        (["run-many", "a.lisp", "b.lisp"], "run-many", None),
+        (["serve", "--port", "0"], "serve", None),
+    ],
+)
+def test_arguments(argv: List[str], command: str, file: Optional[str]) -> None:
+    args = arguments(argv)
+    assert args.command == command
+    assert getattr(args, "file", None) == file
+
+
+def test_arguments_errors(capsys: pytest.CaptureFixture) -> None:
+    with pytest.raises(SystemExit):
+        arguments(["run-many"])
+    with pytest.raises(SystemExit):
+        arguments(["serve", "--socket", "s", "--workers", "0"])
+    assert "--workers must be at least 1" in capsys.readouterr().err
+
+
+def test_form_cache() -> None:
+    forms = FormCache(Optimizer(), maxsize=2)
+    first = forms.read("(+ x (* 2 3))")
+    assert forms.read("(+ x (* 2 3))") is first
+    assert [dump(form) for form in first] == ["(+ x 6)"]
+    assert [dump(form) for form in forms.read("(var x 1) x")] == ["(var x 1)", "x"]
+    forms.read("(f 1)")
+    forms.read("(+ x (* 2 3))")
+    forms.read("(g 1)")
+    # The least recently used are evicted
+    assert list(forms.forms) == ["(+ x (* 2 3))", "(g 1)"]
+
+
+def test_repl(monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture) -> None:
+    lines = iter(["(def (f x)", "  (* x 2))", "", "(f 21)", "(f 21)"])
+
+    def read_line(prompt: str) -> str:
+        print(prompt, end="")
+        return next(lines)
+
+    monkeypatch.setattr("builtins.input", read_line)
+    state: Dict[str, object] = {}
+    with pytest.raises(StopIteration):
+        repl(state, optimizer=Optimizer())
+    out = capsys.readouterr().out
+    assert out.endswith(">>> ... <<< f\n>>> >>> <<< 42\n>>> <<< 42\n>>> ")
+    assert "EXPR::" not in out
+
+    lines = iter(["(f 1)", "exit"])
+    assert repl(state, "vm", debug=True) == 0
+    assert "EXPR::" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_repl_arithmetic(
+    monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture, engine: str
+) -> None:
+    lines = iter(["(+ 1 2)", "(var x 2) (* x 21)", "exit"])
+    monkeypatch.setattr("builtins.input", lambda prompt: next(lines))
+    assert repl({}, engine, optimizer=Optimizer()) == 0
+    assert capsys.readouterr().out.endswith("<<< 3\n<<< 42\n")
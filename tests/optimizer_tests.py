@@ -0,0 +1,92 @@
+import io
+from typing import Dict, List
+
+import pytest
+
+from llisp.lbuiltins import CORE_BUILTINS, Atom
+from llisp.main import ENGINES
+from llisp.optimizer import PURE_BUILTINS, Optimizer, dump
+from llisp.parser import create_program
+
+
+def optimized(source: str, optimizer=None) -> List[str]:
+    optimizer = optimizer or Optimizer()
+    return [dump(optimizer.optimize(form)) for form in create_program(source).childs]
+
+
+def test_pure_builtins() -> None:
+    assert PURE_BUILTINS <= CORE_BUILTINS
+
+
+@pytest.mark.parametrize(
+    "test_input,expected",
+    [
+        ("(- 1000 1)", "999"),
+        ("(+ 1 (* 2 3) (/ 1 2))", "7.5"),
+        ("(sqrt 4)", "(sqrt 4)"),
+        ("(+ x (* 2 3))", "(+ x 6)"),
+        ("(list 1 (+ 1 1))", "(list 1 2)"),
+        ("(push \"a\\n\" (list 'b'))", "(list \"a\\n\" 'b')"),
+        ("(el (list 'a' 'b'))", "'a'"),
+        ("(and 1 (eq 2 2))", "(and 1 1)"),
+        ("(eq (list) [])", "(eq (list) [])"),
+        ("(if (< 1 2) (f 1) (f 2))", "(f 1)"),
+        ("(if 0 (f 1) (f 2))", "(f 2)"),
+        ("(if 0 (f 1))", "(if 0 (f 1))"),
+        ("(if x (+ 1 1) 3)", "(if x 2 3)"),
+        ("(/ 1 0)", "(/ 1 0)"),
+        ("(print (+ 1 2))", "(print 3)"),
+        ("(var x (* 2 2))", "(var x 4)"),
+        ("(def (f x) (var y (// 5 2)) (* x y))", "(def (f x) (var y 2) (* x y))"),
+        ("(defmemo (f x) (+ 1 1))", "(defmemo (f x) 2)"),
+        ("(memoize f 2)", "(memoize f 2)"),
+        ("(vlen (vector 1 2))", "(vlen (vector 1 2))"),
+        ("((+ 1 1) (+ 2 2))", "((+ 1 1) 4)"),
+        ("((f (+ 1 1)) (+ 2 2))", "((f 2) 4)"),
+        ("(dotimes (i (+ 1 1)) (echo (* 2 3)))", "(dotimes (i (+ 1 1)) (echo 6))"),
+        ("(for (i 0 3) (abs -1))", "(for (i 0 3) (abs -1))"),
+    ],
+)
+def test_fold(test_input: str, expected: str) -> None:
+    assert optimized(test_input) == [expected]
+
+
+def test_fold_redefined_natives() -> None:
+    # Natives are not folded, the program may redefine them later on
+    assert optimized("(def (f) (max 1 2)) (def (max a b) 42)") == [
+        "(def (f) (max 1 2))",
+        "(def (max a b) 42)",
+    ]
+    assert optimized("(var if 1) (if 1 2 3)") == ["(var if 1)", "2"]
+
+
+def test_fold_dump() -> None:
+    output = io.StringIO()
+    optimizer = Optimizer(output)
+    optimizer.optimize(create_program("(echo (* 6 7))").childs[0])
+    assert output.getvalue() == "(echo 42)\n"
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "source",
+    [
+        "(def (fib n) (var phi (/ (+ 1 (sqrt 5)) 2)) (// (pow phi n) 1)) (fib 10)",
+        "(def (f l) (if (eq l (list)) 0 (+ 1 (f (pop l))))) (f (list 1 (+ 1 1) 3))",
+        "(def (f x) (if (> 2 1) (* x (- 10 1)) (/ 1 0))) (f 3)",
+        "(strlen (string-append \"ab\" (list->string (list 'c'))))",
+        "(def (f x) ((+ 1 2) x)) (f 5)",
+        "(def (f) (max 1 2)) (def (max a b) 42) (f)",
+    ],
+)
+def test_fold_evaluation(engine: str, source: str) -> None:
+    results = []
+    for optimizer in (None, Optimizer()):
+        state: Dict = {}
+        out: Atom
+        for form in create_program(source).childs:
+            if optimizer is not None:
+                form = optimizer.optimize(form)
+            out = ENGINES[engine](form, state)
+        results.append(str(out.value))
+    assert results[0] == results[1]
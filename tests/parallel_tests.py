@@ -0,0 +1,84 @@
+from typing import Dict, Iterator
+
+import pytest
+
+from llisp import parallel
+from llisp.lbuiltins import NotCallable, ParseError, UndefinedError
+from llisp.main import ENGINES, load_std
+from llisp.parser import create_program
+
+SOURCE = """
+(var offset 100)
+(def (square x) (* x x))
+(def (f x) (+ offset (square (max x 2))))
+"""
+
+
+@pytest.fixture(params=[1, 2], ids=["serial", "pool"])
+def workers(request) -> Iterator[int]:
+    parallel.configure(workers=request.param)
+    yield request.param
+    parallel.shutdown()
+
+
+def evaluate(engine: str, source: str, state: Dict) -> str:
+    parallel.configure(engine=engine)
+    out = None
+    for form in create_program(source).childs:
+        out = ENGINES[engine](form, state)
+    return str(out.value if out is not None else None)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize(
+    "test_input,expected",
+    [
+        ("(pmap f (list 1 2 3 4 5))", "[104, 104, 109, 116, 125]"),
+        ("(pmap f [])", "[]"),
+        ("(pmap f (list 3))", "[109]"),
+        ("(pfor f 0 6)", "[104, 104, 104, 109, 116, 125]"),
+        ("(pfor f 5 5)", "[]"),
+        ("(len (pfor square 0 100))", "100"),
+        ("(def (g x) (pmap square (list x x))) (g 3)", "[9, 9]"),
+    ],
+)
+def test_parallel_map(engine: str, workers: int, test_input: str, expected: str):
+    state: Dict = {}
+    load_std(state)
+    evaluate(engine, SOURCE, state)
+    assert evaluate(engine, test_input, state).replace("(AtomTypes.NUM) ", "") == (
+        expected
+    )
+
+
+@pytest.mark.parametrize(
+    "test_input,error",
+    [
+        ("(pmap g (list 1))", UndefinedError),
+        ("(var g 1) (pmap g (list 1))", NotCallable),
+        ("(pmap len (list (list 1)))", NotCallable),
+        ("(pfor + 0 2)", NotCallable),
+        ("(def (g x) (def (h y) y) (pmap h (list x))) (g 1)", NotCallable),
+        ("(def (g x) x) (pmap g 1)", Exception),
+        ("(def (g x) x) (pfor g 1 [])", Exception),
+        ("(def (g x) x) (pmap g)", ParseError),
+        ("(def (g x) (h x)) (pmap g (list 1 2))", UndefinedError),
+    ],
+)
+def test_parallel_map_errors(workers: int, test_input: str, error: type) -> None:
+    for engine in ENGINES:
+        with pytest.raises(error):
+            evaluate(engine, test_input, {})
+
+
+def test_parallel_map_builtin() -> None:
+    with pytest.raises(NotCallable, match="pmap expects a user-defined procedure"):
+        evaluate("tree", "(pmap len (list (list 1)))", {})
+
+
+def test_collect_globals() -> None:
+    state: Dict = {}
+    evaluate("tree", SOURCE + "(var unused 1) (def (g x) x)", state)
+    values, definitions = parallel.collect_globals(state["f"])
+    assert set(values) == {"offset"}
+    assert [d.childs[1].childs[0].value_str for d in definitions] == ["f", "square"]
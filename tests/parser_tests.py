@@ -0,0 +1,86 @@
+from typing import List
+
+import pytest
+
+from llisp.lbuiltins import LList, ParseError
+from llisp.parser import create_program, listing, read, tokenize
+
+
+@pytest.mark.parametrize(
+    "test_input,expected",
+    [
+        ("(+ 1 1)", ["(", "+", "1", "1", ")"]),
+        ("(+ 1(f))", ["(", "+", "1", "(", "f", ")", ")"]),
+        ("  a\n\tb  ", ["a", "b"]),
+        ("(echo ' ')", ["(", "echo", "' '", ")"]),
+        ('(var x "a b")', ["(", "var", "x", '"a b"', ")"]),
+        ("(eq '(' ')')", ["(", "eq", "'('", "')'", ")"]),
+    ],
+)
+def test_tokenize(test_input: str, expected: List[str]) -> None:
+    assert list(tokenize([test_input])) == expected
+
+
+@pytest.mark.parametrize(
+    "chunks",
+    [
+        ["(def (fa", "ct n) (* n 1", "0)) (echo 'a", "')"],
+        ["(def (fact n) (* n 10)) (echo 'a')"],
+        ["(def (fact n)\n", "(* n 10))\n", "(echo 'a')\n"],
+    ],
+)
+def test_tokenize_chunks(chunks: List[str]) -> None:
+    assert list(tokenize(chunks)) == list(tokenize(["".join(chunks)]))
+
+
+@pytest.mark.parametrize("test_input", ["(echo 'a)", '(var x "abc)'])
+def test_tokenize_unterminated(test_input: str) -> None:
+    with pytest.raises(ParseError):
+        list(tokenize([test_input]))
+
+
+def test_tokenize_open_string_chunks() -> None:
+    chunks = ['(echo "a', "\\", '"b\n', "c", '" 1)']
+    assert list(tokenize(chunks)) == ["(", "echo", '"a\\"b\nc"', "1", ")"]
+    with pytest.raises(ParseError):
+        list(tokenize(['(echo "a', "b\\", '"']))
+
+
+@pytest.mark.parametrize("test_input", ["(+ 1 2))", ")", "(+ 1 (f 2)", "(("])
+def test_read_unbalanced(test_input: str) -> None:
+    with pytest.raises(ParseError):
+        list(read(tokenize([test_input])))
+
+
+def test_read_forms() -> None:
+    forms = list(read(tokenize(["(+ 1 1) 2 ((f))"])))
+    assert len(forms) == 3
+    assert isinstance(forms[0], LList) and len(forms[0].childs) == 3
+    assert forms[1].value == 2
+    assert isinstance(forms[2].childs[0], LList)
+
+
+def test_listing_deep_nesting() -> None:
+    depth = 50_000
+    expr = "(+ 1 " * depth + "1" + ")" * depth
+    node = listing(expr)
+    for _ in range(depth + 1):
+        assert isinstance(node, LList)
+        node = node.childs[-1]
+    assert node.value == 1
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (["(def (five) 5)", "(five)"], "5"),
+        (["(def (five) 5)", "(+ 1 (five))"], "6"),
+        (['(var x "a\\nb")', "(el (pop x))"], "\n"),
+    ],
+)
+def test_read_programs(test_inputs: List[str], expected: str) -> None:
+    state: dict = {}
+    out = None
+    for t in test_inputs:
+        out = create_program(t).run(state).value
+    assert str(out) == expected
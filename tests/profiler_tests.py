@@ -0,0 +1,78 @@
+import io
+from typing import Dict
+
+import pytest
+
+from llisp import closures
+from llisp.lbuiltins import BUILTINS, Name
+from llisp.main import ENGINES
+from llisp.parser import create_program
+from llisp.profiler import ENGINES as PROFILED_ENGINES, Profiler
+
+SOURCE = """
+(def (double x) (* 2 x))
+(def (f n acc) (if (eq n 0) acc (f (- n 1) (+ acc (double n)))))
+(def (g n) (if (eq n 0) 0 (+ 1 (g (- n 1)))))
+(f 10 0)
+(g 5)
+"""
+
+
+def run(engine: str, profile: Profiler) -> None:
+    state: Dict = {}
+    with profile:
+        for form in create_program(SOURCE).childs:
+            ENGINES[engine](form, state)
+
+
+@pytest.mark.parametrize("engine", PROFILED_ENGINES)
+def test_profile_procedures(engine: str) -> None:
+    profile = Profiler()
+    run(engine, profile)
+    assert profile.stats["double"].calls == 10
+    assert profile.stats["f"].calls == 11
+    assert profile.stats["g"].calls == 6
+    # The recursion of g is not counted several times
+    g = profile.stats["g"]
+    assert g.self_time <= g.cumulative
+    assert sum(s.self_time for s in profile.stats.values()) >= g.cumulative
+    assert profile.stack == [] and profile.children == []
+
+
+def test_profile_builtins() -> None:
+    profile = Profiler()
+    run("tree", profile)
+    assert profile.stats["eq"].calls == 17
+    assert profile.stats["def"].calls == 3
+    assert any(line.endswith("  double") for line in profile.table())
+
+
+def test_profile_stacks() -> None:
+    profile = Profiler()
+    run("tree", profile)
+    output = io.StringIO()
+    profile.write_stacks(output)
+    stacks = dict(line.rsplit(" ", 1) for line in output.getvalue().splitlines())
+    assert "g;if;+;g" in stacks
+    assert all(int(time) >= 0 for time in stacks.values())
+
+
+def test_profile_uninstall() -> None:
+    builtins = dict(BUILTINS)
+    run_body = Name.run_body
+    compile_proc = closures.compile_proc
+    run("closure", Profiler())
+    assert BUILTINS == builtins
+    assert Name.run_body is run_body
+    assert closures.compile_proc is compile_proc
+
+
+def test_profile_cached_calls() -> None:
+    state: Dict = {}
+    forms = create_program(SOURCE).childs
+    for form in forms:
+        form.evaluate(state)
+    with Profiler() as profile:
+        forms[-1].evaluate(state)
+    assert profile.stats["g"].calls == 6
+    assert profile.stats["eq"].calls == 6
@@ -3,23 +3,24 @@ from typing import Dict, Union
 import pytest
 
 from llisp.lbuiltins import Atom, LList
-from llisp.main import execute_file, load_std
-from tests.std_tests import std_state  # noqa: F401
+from llisp.main import ENGINES, execute_file
+from tests.std_tests import std_base_state, std_state  # noqa: F401
 
 
 def simple_test_file(
     std_state: Dict[str, Union[LList, Atom]],  # noqa: F811
     test_file: str,
     expected: str,
+    engine: str,
 ) -> None:
     state = std_state
-    load_std(state)
-    execute_file(test_file, state)
+    execute_file(test_file, state, engine=engine)
 
     assert state["output"].value == expected
 
 
-@pytest.mark.parametrize(  # noqa: F811
+@pytest.mark.parametrize("engine", ENGINES)  # noqa: F811
+@pytest.mark.parametrize(
     "test_file,expected",
     [
         ("project_euler/problem1.lisp", 233_168),
@@ -27,6 +28,9 @@ def simple_test_file(
     ],
 )
 def test_problem(
-    std_state: Dict[str, object], test_file: str, expected: str  # noqa: F811
+    std_state: Dict[str, object],  # noqa: F811
+    test_file: str,
+    expected: str,
+    engine: str,
 ) -> None:
-    return simple_test_file(std_state, test_file, expected)
+    return simple_test_file(std_state, test_file, expected, engine)
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import pytest
+
+from llisp.server import Server
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+@pytest.fixture(scope="module")
+def server() -> Server:
+    return Server(workers=2)
+
+
+async def request(connection: Connection, source: Any, id: int = 0) -> Dict:
+    reader, writer = connection
+    line = json.dumps({"id": id, "source": source}) if source is not None else "{"
+    writer.write(line.encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+
+async def close(server: asyncio.Server, *connections: Connection) -> None:
+    for _, writer in connections:
+        writer.close()
+        await writer.wait_closed()
+    # Let the sessions read the end of their connection
+    await asyncio.sleep(0.01)
+    server.close()
+    await server.wait_closed()
+
+
+async def session(server: Server, sources: List[Any]) -> List[Dict]:
+    tcp = await server.start(port=0)
+    port = tcp.sockets[0].getsockname()[1]
+    connection = await asyncio.open_connection("127.0.0.1", port)
+    responses = [await request(connection, s, i) for i, s in enumerate(sources)]
+    await close(tcp, connection)
+    return responses
+
+
+def test_serve(server: Server, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(sys, "stdout", server.output)
+    responses = asyncio.run(
+        session(
+            server,
+            [
+                "(def (f x) (* x 2)) (echo (f 21))",
+                "(f (len (reverse (list 1 2))))",
+                "(g)",
+                None,
+                1,
+            ],
+        )
+    )
+    assert responses[0] == {"id": 0, "value": "42", "output": "42", "error": None}
+    assert responses[1]["value"] == "4"
+    assert responses[2]["error"].startswith("UndefinedError")
+    assert responses[3]["error"].startswith("Invalid request")
+    assert responses[4] == {
+        "id": 4,
+        "value": None,
+        "output": "",
+        "error": "Invalid request: source is not a string",
+    }
+
+
+def test_serve_sessions(server: Server, tmp_path: Path) -> None:
+    """Sessions are isolated, and a long evaluation does not block the others"""
+    path = str(tmp_path / "llisp.sock")
+
+    async def run() -> Tuple[Dict, Dict, List[str]]:
+        unix = await server.start(path=path)
+        first = await asyncio.open_unix_connection(path)
+        second = await asyncio.open_unix_connection(path)
+        await request(first, "(var x 1)")
+        done: List[str] = []
+
+        async def long() -> Dict:
+            source = "(def (f n) (if (eq n 0) x (f (- n 1)))) (f 100000)"
+            response = await request(first, source)
+            done.append("long")
+            return response
+
+        async def short() -> Dict:
+            await asyncio.sleep(0.05)
+            response = await request(second, "x")
+            done.append("short")
+            return response
+
+        results = await asyncio.gather(long(), short())
+        await close(unix, first, second)
+        return results[0], results[1], done
+
+    long, short, done = asyncio.run(run())
+    assert long["value"] == "1"
+    assert short["error"] == "UndefinedError: x Undefined"
+    assert done == ["short", "long"]
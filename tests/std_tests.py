@@ -2,27 +2,46 @@ from typing import Dict, List
 
 import pytest
 
-from llisp.main import load_std
+from llisp.lbuiltins import BUILTINS, NATIVES, Environment, LList, State, custom_op
+from llisp.main import ENGINES, STD_PATH, execute_file, std_base
 from llisp.parser import listing
 
 
+@pytest.fixture(scope="session")
+def std_base_state() -> State:
+    return std_base()
+
+
 @pytest.fixture
-def std_state() -> Dict[str, object]:
-    state: Dict[str, object] = {}
-    load_std(state)
+def std_state(std_base_state: State) -> State:
+    return std_base_state.fork()
+
+
+@pytest.fixture(scope="session")
+def std_lisp_state() -> Dict:
+    """State of std.lisp, with its reference definitions of the natives"""
+    state: Dict = {}
+    execute_file(STD_PATH, state)
     return state
 
 
 def simple_multi_std(
     std_state: Dict[str, object], test_inputs: List[str], expected: str
 ) -> None:
-    state = std_state
-    out = None
-    for t in test_inputs:
-        e = listing(t, None)
-        out = e.evaluate(state).value
+    for evaluate in ENGINES.values():
+        state = Environment(parent=std_state)
+        out = None
+        for t in test_inputs:
+            e = listing(t, None)
+            out = evaluate(e, state).value
+
+        assert str(out) == expected
+
 
-    assert str(out) == expected
+def test_set_std(std_base_state: State, std_state: State) -> None:
+    simple_multi_std(std_state, ["(set! pi 3)", "(* pi 2)"], "6")
+    assert dict(std_state)["pi"].value == 3
+    assert std_base_state["pi"].value == 3.141592
 
 
 @pytest.mark.parametrize(
@@ -153,3 +172,55 @@ def test_toint(
     std_state: Dict[str, object], test_inputs: List[str], expected: str
 ) -> None:
     return simple_multi_std(std_state, test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "test_inputs,expected",
+    [
+        (["(and 0 (undefined 1))"], "0"),
+        (["(or 1 (undefined 1))"], "1"),
+        (["(and 1 2 0)"], "0"),
+        (["(or 0 0 3)"], "1"),
+        (["(> 2 1)"], "1"),
+        (["(> 1 1)"], "0"),
+        (["(>= 1 1)"], "1"),
+        (["(<= 2 1)"], "0"),
+        (["(max 3 -1)"], "3"),
+        (["(abs -2.5)"], "2.5"),
+        (["(pow 2 10)"], "1024"),
+        (["(pow 1.5 0)"], "1"),
+        (["(sqrt 16)"], "4.0"),
+        (["(len (list 1 2 3))"], "3"),
+        (["(len [])"], "0"),
+    ],
+)
+def test_native_std(
+    std_state: Dict[str, object], test_inputs: List[str], expected: str
+) -> None:
+    return simple_multi_std(std_state, test_inputs, expected)
+
+
+@pytest.mark.parametrize(
+    "name,args",
+    [
+        (name, args)
+        for name in ["and", "or", "xor", ">", "<=", ">=", "min", "max"]
+        for args in [["1", "2"], ["2", "1"], ["0", "0"], ["0", "1.5"], ["'a'", "0"]]
+    ]
+    + [(name, [x]) for name in ["bool", "!"] for x in ["0", "-3", "2.5", "'a'"]]
+    + [("abs", [x]) for x in ["0", "-3", "2.5"]]
+    + [("pow", ["2", "5"]), ("pow", ["1.5", "3"]), ("len", ["(list 1 2 3)"])],
+)
+def test_native_std_matches_lisp(
+    std_lisp_state: Dict[str, object], name: str, args: List[str]
+) -> None:
+    expr = listing(f"({name} {' '.join(args)})")
+    assert isinstance(expr, LList)
+    expr = expr.childs[0]
+    assert BUILTINS[name](expr, std_lisp_state) == custom_op(name, expr, std_lisp_state)
+
+
+def test_std_natives(std_state: State) -> None:
+    # load_std leaves the names of the natives unbound
+    assert not NATIVES & std_state.keys()
+    assert not NATIVES & std_state.parent.keys()